@@ -0,0 +1,216 @@
+# analysis.py
+import json
+from datetime import datetime
+from langchain.schema import HumanMessage, SystemMessage
+from llm import invoke_llm, record_prompt_compaction
+from rules import (RULE_ENGINE_ENABLED, compare_documents, merge_rule_results, review_rule_result,
+                   has_unsectioned_tables)
+from compaction import compact_prompt_inputs
+from fanout import use_fanout, analyze_sections
+from cache import llm_cache_key, get_cached_analysis, store_cached_analysis
+
+# Single-request analysis prompt; its text is part of the LLM cache key
+ANALYSIS_SYSTEM_PROMPT = """
+    You are a pharmaceutical compliance expert. Your task is to analyze and compare a supplier's Certificate of Analysis (CoA) 
+    with a manufacturer's batch test results for the same product. Extract relevant information, identify matching 
+    and non-matching parameters, and determine overall compliance.
+
+    Please follow these steps:
+    1. Extract batch information, product details, and test dates
+    2. Identify and compare physical characteristics from both documents
+    3. Identify and compare chemical analysis results from both documents
+    4. Identify and compare microbiological testing results from both documents
+    5. Determine overall compliance status based on the comparisons
+    6. Create certification information
+
+    Format your response as a JSON object with the following structure:
+    {
+        "batch_info": {
+            "batch_reference": "string",
+            "supplier_batch": "string",
+            "supplier": "string (supplier company name)",
+            "product": "string",
+            "comparison_date": "string (YYYY-MM-DD)"
+        },
+        "physical_characteristics": [
+            {
+                "parameter": "string",
+                "supplier_result": "string",
+                "manufacturer_result": "string",
+                "status": "string (MATCH, WITHIN TOLERANCE, NON-COMPLIANT)"
+            }
+        ],
+        "chemical_analysis": [
+            {
+                "test": "string",
+                "supplier_result": "string",
+                "manufacturer_result": "string",
+                "status": "string (MATCH, WITHIN TOLERANCE, COMPLIANT, NON-COMPLIANT)"
+            }
+        ],
+        "microbiological_testing": [
+            {
+                "parameter": "string",
+                "supplier_result": "string",
+                "manufacturer_result": "string",
+                "status": "string (MATCH, COMPLIANT, NON-COMPLIANT)"
+            }
+        ],
+        "compliance_summary": {
+            "overall_compliance": "string (FULLY COMPLIANT, PARTIALLY COMPLIANT, NON-COMPLIANT)",
+            "variation_tolerance": "string",
+            "batch_approval_status": "string (APPROVED, REJECTED)"
+        },
+        "certification": {
+            "certified_by": "string",
+            "reviewed_by": "string",
+            "certification_number": "string",
+            "certification_date": "string (YYYY-MM-DD)"
+        }
+    }
+
+    Return only the JSON object without any explanations or additional text.
+    """
+
+ANALYSIS_HUMAN_PROMPT = """
+    Supplier Certificate of Analysis Text:
+    {supplier_text}
+
+    Manufacturer Batch Test Report Text:
+    {manufacturer_text}
+
+    Batch Reference: {batch_reference}
+
+    Please analyze these documents and provide the comparison results in the JSON format specified.
+    """
+
+REQUIRED_KEYS = ['batch_info', 'physical_characteristics', 'chemical_analysis',
+                 'microbiological_testing', 'compliance_summary', 'certification']
+
+
+def analyze_document_pair(database, model_name, supplier_text, manufacturer_text, batch_reference, warn=print):
+    """
+    Compare a supplier CoA with a manufacturer batch report: deterministic rules first, then the
+    compacted text through the per-section fan-out or a single cached LLM request for what is left.
+    warn reports a recoverable problem to the caller's UI or log. If the LLM request fails, the rule
+    result is returned with undecided rows held for review; without one, the error is raised.
+    """
+    # Well-structured CoAs are compared by deterministic rules; the LLM is only needed
+    # when some parameter rows could not be parsed or decided
+    rule_result, unresolved = (compare_documents(supplier_text, manufacturer_text, batch_reference)
+                               if RULE_ENGINE_ENABLED else (None, []))
+    if rule_result is not None and not unresolved:
+        return rule_result
+
+    try:
+        return analyze_with_llm(database, model_name, supplier_text, manufacturer_text, batch_reference,
+                                rule_result, unresolved, warn)
+    except Exception as e:
+        if rule_result is None:
+            raise
+        # Never replace what the rules decided, a NON-COMPLIANT row above all, with a default analysis
+        warn(f"LLM analysis failed, returning the rule engine results for review: {e}")
+        return review_rule_result(rule_result, unresolved, supplier_text, manufacturer_text)
+
+
+def analyze_with_llm(database, model_name, supplier_text, manufacturer_text, batch_reference, rule_result,
+                     unresolved, warn):
+    """Send what the rules left undecided to the LLM and merge its answer with the rule result"""
+    # The LLM only needs the analytical content; the rules above still see the full text
+    supplier_text, manufacturer_text, tokens_before, tokens_after = compact_prompt_inputs(supplier_text,
+                                                                                         manufacturer_text)
+    record_prompt_compaction(tokens_before, tokens_after)
+    print(f"Prompt compaction for batch {batch_reference}: ~{tokens_before} -> ~{tokens_after} tokens "
+          f"({tokens_before - tokens_after} saved)")
+
+    # Table rows outside the known sections would only reach the fan-out's summary request, which
+    # does not compare them, so those documents go to the single full-document request
+    if rule_result is not None:
+        unsectioned_rows = any(category is None for category, _ in unresolved)
+    else:
+        unsectioned_rows = has_unsectioned_tables(supplier_text) or has_unsectioned_tables(manufacturer_text)
+
+    # Long certificates are analyzed as concurrent per-section requests, so latency follows the
+    # slowest section; sections the rules fully decided are not sent at all
+    if use_fanout(supplier_text, manufacturer_text) and not unsectioned_rows:
+        try:
+            categories = {category for category, _ in unresolved} if rule_result is not None else None
+            result = analyze_sections(database, model_name, supplier_text, manufacturer_text, batch_reference,
+                                      categories)
+            if result is not None:
+                return merge_rule_results(result, rule_result)
+        except Exception as e:
+            warn(f"Sectioned analysis failed, falling back to a single request: {e}")
+
+    # Temperature is 0, so identical inputs can safely reuse a previous response
+    cache_key = llm_cache_key(model_name, ANALYSIS_SYSTEM_PROMPT, supplier_text, manufacturer_text, batch_reference)
+    cached_result = get_cached_analysis(database, cache_key)
+    if cached_result is not None:
+        return merge_rule_results(cached_result, rule_result)
+
+    messages = [
+        SystemMessage(content=ANALYSIS_SYSTEM_PROMPT),
+        HumanMessage(content=ANALYSIS_HUMAN_PROMPT.format(supplier_text=supplier_text,
+                                                          manufacturer_text=manufacturer_text,
+                                                          batch_reference=batch_reference))
+    ]
+    result = json.loads(invoke_llm(model_name, messages).content)
+    if not all(key in result for key in REQUIRED_KEYS):
+        raise ValueError("Invalid response format from LLM")
+
+    store_cached_analysis(database, cache_key, model_name, result)
+    return merge_rule_results(result, rule_result)
+
+
+def generate_fallback_analysis(batch_reference):
+    """Generate fallback analysis in case of LLM failure"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    return {
+        "batch_info": {
+            "batch_reference": batch_reference,
+            "supplier_batch": f"S-{batch_reference}",
+            "product": "Pharmaceutical Product",
+            "comparison_date": today
+        },
+        "physical_characteristics": [
+            {
+                "parameter": "Appearance",
+                "supplier_result": "Complies",
+                "manufacturer_result": "Complies",
+                "status": "MATCH"
+            },
+            {
+                "parameter": "Particle Size",
+                "supplier_result": "Within spec",
+                "manufacturer_result": "Within spec",
+                "status": "MATCH"
+            }
+        ],
+        "chemical_analysis": [
+            {
+                "test": "Purity",
+                "supplier_result": "99.5%",
+                "manufacturer_result": "99.4%",
+                "status": "WITHIN TOLERANCE"
+            }
+        ],
+        "microbiological_testing": [
+            {
+                "parameter": "Total Aerobic Count",
+                "supplier_result": "<10 CFU/g",
+                "manufacturer_result": "<10 CFU/g",
+                "status": "MATCH"
+            }
+        ],
+        "compliance_summary": {
+            "overall_compliance": "FULLY COMPLIANT",
+            "variation_tolerance": "Within Acceptable Limits",
+            "batch_approval_status": "APPROVED"
+        },
+        "certification": {
+            "certified_by": "Automated System",
+            "reviewed_by": "QA Officer",
+            "certification_number": f"CERT-{batch_reference}",
+            "certification_date": today
+        }
+    }
@@ -1,25 +1,33 @@
 # app.py
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, send_file
 import os
 import json
 import sqlite3
 import uuid
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import zipfile
 from werkzeug.utils import secure_filename
-import PyPDF2
-from pdf2image import convert_from_path
-from PIL import Image
 import io
 import re
-import pytesseract
 from langchain_community.llms import OpenAI
 # from langchain_community.chat_models import ChatOpenAI
-from langchain_groq import ChatGroq
+from llm import get_llm_stats
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from langchain.schema import HumanMessage, SystemMessage
 import numpy as np
 from dotenv import load_dotenv
+from ocr import run_ocr_task, read_text_layer, ocr_image, ocr_pdf_pages, MIN_TEXT_LAYER_CHARS
+from uploads import save_upload_stream
+from compaction import PAGE_BREAK
+from analysis import analyze_document_pair, generate_fallback_analysis
+from reports import get_report_artifact, report_etag
+from export import stream_report_archive
+from db import (connect, begin_write, apply_migrations, save_comparison, save_comparisons,
+                search_comparisons_page, search_documents_text, highlight_snippet, aggregate_comparison_items,
+                get_document_text, SEARCH_PAGE_SIZE, TEXT_SEARCH_LIMIT)
+from cache import (init_cache_tables, file_sha256, get_cached_text, store_cached_text,
+                   get_cache_stats)
 
 
 # Load environment variables
@@ -33,17 +41,21 @@ app = Flask(__name__, static_folder='static', template_folder='templates')
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
-DATABASE = 'coa_database.db'
+DATABASE = os.getenv("COA_DATABASE", "coa_database.db")  # Its -wal and -shm files live in the same directory
+LLM_MODEL_NAME = "llama-3.1-8b-instant"
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "4"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))  # Concurrent pairs per batch request
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "8"))  # Documents extracted at once; the OCR pool does the heavy work
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("MAX_UPLOAD_MB", "256")) * 1024 * 1024  # Uploads are streamed to disk, not held in memory
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect(DATABASE)
+    conn = connect(DATABASE)
     cursor = conn.cursor()
     
     # Create documents table
@@ -72,216 +84,176 @@ def init_db():
     )
     ''')
     
+    # Create jobs table for asynchronous analysis requests
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        updated_at TIMESTAMP NOT NULL,
+        comparison_id TEXT,
+        error TEXT,
+        FOREIGN KEY (comparison_id) REFERENCES comparisons (id)
+    )
+    ''')
+    
+    # Create cache tables
+    init_cache_tables(cursor)
+    
+    # Apply schema migrations (indexes)
+    apply_migrations(cursor)
+    
     conn.commit()
     conn.close()
 
 # Initialize database on startup
 init_db()
 
+# Background worker pool for asynchronous analysis jobs
+analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="analysis")
+extraction_executor = ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="extraction")
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 # OCR Functions
 def extract_text_from_pdf(pdf_path):
-    """Extract text from a text-based PDF."""
+    """
+    Extract text from a PDF, OCR-ing in parallel only the pages that have no text layer.
+    Returns (text, complete); complete is False when any page could not be read.
+    """
     try:
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page_num in range(len(reader.pages)):
-                text += reader.pages[page_num].extract_text()
-                text += "\n\n"
-        return text
+        # Reading the text layer is quick, so it runs here rather than queueing behind OCR work
+        page_texts = read_text_layer(pdf_path)
+        
+        # Pages with too little text are scans, so only those are rasterized and OCR'd
+        scanned_pages = [page_num + 1 for page_num, page_text in enumerate(page_texts)
+                         if len(page_text.strip()) < MIN_TEXT_LAYER_CHARS]
+        complete = True
+        if scanned_pages:
+            for page_number, ocr_text in zip(scanned_pages, ocr_pdf_pages(pdf_path, scanned_pages)):
+                if isinstance(ocr_text, Exception):
+                    print(f"Error running OCR on page {page_number}, keeping its text layer: {ocr_text}")
+                    complete = False
+                    continue
+                # A blank page can be sent to OCR too, so keep whichever reading has more text
+                if len(ocr_text.strip()) > len(page_texts[page_number - 1].strip()):
+                    page_texts[page_number - 1] = ocr_text
+        
+        return "".join(page_text + "\n\n" + PAGE_BREAK for page_text in page_texts), complete
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-        return ""
+        return "", False
 
 def extract_text_from_image(image_path):
     """Extract text from image using OCR"""
     try:
-        img = Image.open(image_path)
-        text = pytesseract.image_to_string(img)
-        return text
+        return run_ocr_task(ocr_image, image_path)
     except Exception as e:
         print(f"Error extracting text from image: {e}")
         return ""
 
-def extract_text(file_path):
-    """Extract text based on file type"""
+def extract_text(file_path, content_hash=None):
+    """Extract text based on file type, reusing cached text for previously seen files"""
+    if content_hash is None:
+        content_hash = file_sha256(file_path)
+    cached_text = get_cached_text(DATABASE, content_hash)
+    if cached_text is not None:
+        return cached_text
+    
     if file_path.lower().endswith('.pdf'):
-        return extract_text_from_pdf(file_path)
+        text, complete = extract_text_from_pdf(file_path)
     elif file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-        return extract_text_from_image(file_path)
+        text, complete = extract_text_from_image(file_path), True
     else:
         return ""
+    
+    # Only cache complete extractions so failed documents and pages are retried on the next upload
+    if text and complete:
+        store_cached_text(DATABASE, content_hash, text)
+    return text
 
 # Analysis Functions
 def analyze_documents(supplier_text, manufacturer_text, batch_reference):
-    """
-    Use LLM to analyze and compare supplier and manufacturer documents
-    """
-    # System prompt for the LLM
-    system_prompt = """
-    You are a pharmaceutical compliance expert. Your task is to analyze and compare a supplier's Certificate of Analysis (CoA) 
-    with a manufacturer's batch test results for the same product. Extract relevant information, identify matching 
-    and non-matching parameters, and determine overall compliance.
-
-    Please follow these steps:
-    1. Extract batch information, product details, and test dates
-    2. Identify and compare physical characteristics from both documents
-    3. Identify and compare chemical analysis results from both documents
-    4. Identify and compare microbiological testing results from both documents
-    5. Determine overall compliance status based on the comparisons
-    6. Create certification information
-
-    Format your response as a JSON object with the following structure:
-    {
-        "batch_info": {
-            "batch_reference": "string",
-            "supplier_batch": "string",
-            "product": "string",
-            "comparison_date": "string (YYYY-MM-DD)"
-        },
-        "physical_characteristics": [
-            {
-                "parameter": "string",
-                "supplier_result": "string",
-                "manufacturer_result": "string",
-                "status": "string (MATCH, WITHIN TOLERANCE, NON-COMPLIANT)"
-            }
-        ],
-        "chemical_analysis": [
-            {
-                "test": "string",
-                "supplier_result": "string",
-                "manufacturer_result": "string",
-                "status": "string (MATCH, WITHIN TOLERANCE, COMPLIANT, NON-COMPLIANT)"
-            }
-        ],
-        "microbiological_testing": [
-            {
-                "parameter": "string",
-                "supplier_result": "string",
-                "manufacturer_result": "string",
-                "status": "string (MATCH, COMPLIANT, NON-COMPLIANT)"
-            }
-        ],
-        "compliance_summary": {
-            "overall_compliance": "string (FULLY COMPLIANT, PARTIALLY COMPLIANT, NON-COMPLIANT)",
-            "variation_tolerance": "string",
-            "batch_approval_status": "string (APPROVED, REJECTED)"
-        },
-        "certification": {
-            "certified_by": "string",
-            "reviewed_by": "string",
-            "certification_number": "string",
-            "certification_date": "string (YYYY-MM-DD)"
-        }
-    }
-
-    Return only the JSON object without any explanations or additional text.
-    """
-
-    # Prepare human message with the document texts
-    human_message = f"""
-    Supplier Certificate of Analysis Text:
-    {supplier_text}
-
-    Manufacturer Batch Test Report Text:
-    {manufacturer_text}
-
-    Batch Reference: {batch_reference}
-
-    Please analyze these documents and provide the comparison results in the JSON format specified.
-    """
-
-    # Initialize ChatOpenAI (replace with your model and API key setup)
-
-    # Using LangChain with OpenAI model
+    """Compare a supplier and manufacturer document, falling back to a default analysis if the LLM fails"""
     try:
-        chat = ChatGroq(temperature=0, model_name="llama-3.1-8b-instant")
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=human_message)
-        ]
-        
-        # response = chat(messages)
-        response = chat.invoke(messages)
-        print(response.content)
-        result = json.loads(response.content)
-        
-        # Validate JSON structure (simple check)
-        required_keys = ['batch_info', 'physical_characteristics', 'chemical_analysis', 
-                        'microbiological_testing', 'compliance_summary', 'certification']
-        
-        if not all(key in result for key in required_keys):
-            raise ValueError("Invalid response format from LLM")
-            
-        return result
+        return analyze_document_pair(DATABASE, LLM_MODEL_NAME, supplier_text, manufacturer_text, batch_reference)
     except Exception as e:
         print(f"Error in LLM analysis: {e}")
-        # Return fallback/default analysis in case of error
         return generate_fallback_analysis(batch_reference)
 
-def generate_fallback_analysis(batch_reference):
-    """Generate fallback analysis in case of LLM failure"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    return {
-        "batch_info": {
-            "batch_reference": batch_reference,
-            "supplier_batch": f"S-{batch_reference}",
-            "product": "Pharmaceutical Product",
-            "comparison_date": today
-        },
-        "physical_characteristics": [
-            {
-                "parameter": "Appearance",
-                "supplier_result": "Complies",
-                "manufacturer_result": "Complies",
-                "status": "MATCH"
-            },
-            {
-                "parameter": "Particle Size",
-                "supplier_result": "Within spec",
-                "manufacturer_result": "Within spec",
-                "status": "MATCH"
-            }
-        ],
-        "chemical_analysis": [
-            {
-                "test": "Purity",
-                "supplier_result": "99.5%",
-                "manufacturer_result": "99.4%",
-                "status": "WITHIN TOLERANCE"
-            }
-        ],
-        "microbiological_testing": [
-            {
-                "parameter": "Total Aerobic Count",
-                "supplier_result": "<10 CFU/g",
-                "manufacturer_result": "<10 CFU/g",
-                "status": "MATCH"
-            }
-        ],
-        "compliance_summary": {
-            "overall_compliance": "FULLY COMPLIANT",
-            "variation_tolerance": "Within Acceptable Limits",
-            "batch_approval_status": "APPROVED"
-        },
-        "certification": {
-            "certified_by": "Automated System",
-            "reviewed_by": "QA Officer",
-            "certification_number": f"CERT-{batch_reference}",
-            "certification_date": today
-        }
-    }
-
 # Routes
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def save_uploaded_document(stream, original_filename):
+    """Stream an uploaded file into UPLOAD_FOLDER and describe the saved document"""
+    document_id = str(uuid.uuid4())
+    filename = secure_filename(original_filename)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f"{document_id}_{filename}")
+    
+    # Stream uploads to disk in blocks, hashing them for the extraction cache on the way
+    content_hash, _ = save_upload_stream(stream, path)
+    return {'id': document_id, 'filename': filename, 'path': path, 'hash': content_hash}
+
+def start_extraction(document):
+    """Begin extracting a saved document in the background and return the future"""
+    return extraction_executor.submit(extract_text, document['path'], document['hash'])
+
+def extract_document_pair(supplier_doc, manufacturer_doc):
+    """
+    Extract both documents of a pair concurrently, reusing extractions already started
+    when the upload was saved, so the pair takes about as long as the slower document.
+    """
+    futures = [document.get('extraction') or start_extraction(document) for document in (supplier_doc, manufacturer_doc)]
+    return tuple(future.result() for future in futures)
+
+def extract_and_analyze(supplier_doc, manufacturer_doc, batch_number):
+    """Extract text from a saved document pair and compare it with the LLM"""
+    # Extract text using OCR
+    supplier_text, manufacturer_text = extract_document_pair(supplier_doc, manufacturer_doc)
+    
+    # Analyze documents
+    analysis_result = analyze_documents(supplier_text, manufacturer_text, batch_number)
+    return supplier_text, manufacturer_text, analysis_result
+
+def run_analysis_pipeline(supplier_doc, manufacturer_doc, batch_number):
+    """Extract, analyze and store a saved supplier/manufacturer document pair"""
+    # Analyze documents before opening the write transaction so concurrent jobs don't block on the LLM call
+    supplier_text, manufacturer_text, analysis_result = extract_and_analyze(supplier_doc, manufacturer_doc, batch_number)
+    
+    # Store documents and comparison in database
+    comparison_id = str(uuid.uuid4())
+    print(comparison_id)
+    
+    save_comparison(DATABASE, comparison_id, supplier_doc, supplier_text, manufacturer_doc, manufacturer_text,
+                    batch_number, analysis_result)
+    
+    return comparison_id, analysis_result
+
+def update_job(job_id, status, comparison_id=None, error=None):
+    """Record the current status of an analysis job"""
+    conn = connect(DATABASE)
+    cursor = conn.cursor()
+    begin_write(conn)
+    cursor.execute(
+        "UPDATE jobs SET status = ?, updated_at = ?, comparison_id = ?, error = ? WHERE id = ?",
+        (status, datetime.now().isoformat(), comparison_id, error, job_id)
+    )
+    conn.commit()
+    conn.close()
+
+def run_analysis_job(job_id, *pipeline_args):
+    """Run the analysis pipeline in a background worker and track its status"""
+    try:
+        update_job(job_id, 'running')
+        comparison_id, _ = run_analysis_pipeline(*pipeline_args)
+        update_job(job_id, 'completed', comparison_id=comparison_id)
+    except Exception as e:
+        print(f"Error in analysis job {job_id}: {e}")
+        update_job(job_id, 'failed', error='An error occurred while processing the documents')
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_documents_api():
     if 'supplier_coa' not in request.files or 'manufacturer_results' not in request.files:
@@ -290,6 +262,7 @@ def analyze_documents_api():
     supplier_file = request.files['supplier_coa']
     manufacturer_file = request.files['manufacturer_results']
     batch_number = request.form.get('batch_number', '')
+    run_async = request.args.get('async', '').lower() in ('1', 'true', 'yes')
     
     # Validate files
     if supplier_file.filename == '' or manufacturer_file.filename == '':
@@ -299,61 +272,196 @@ def analyze_documents_api():
         return jsonify({'error': 'Invalid file type'}), 400
     
     try:
-        # Save files
-        supplier_id = str(uuid.uuid4())
-        manufacturer_id = str(uuid.uuid4())
-        
-        supplier_filename = secure_filename(supplier_file.filename)
-        manufacturer_filename = secure_filename(manufacturer_file.filename)
+        # Save files, starting each extraction as soon as its file is on disk so OCR overlaps
+        # the remaining upload handling and the job bookkeeping below
+        supplier_doc = save_uploaded_document(supplier_file.stream, supplier_file.filename)
+        supplier_doc['extraction'] = start_extraction(supplier_doc)
+        manufacturer_doc = save_uploaded_document(manufacturer_file.stream, manufacturer_file.filename)
+        manufacturer_doc['extraction'] = start_extraction(manufacturer_doc)
         
-        supplier_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{supplier_id}_{supplier_filename}")
-        manufacturer_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{manufacturer_id}_{manufacturer_filename}")
+        pipeline_args = (supplier_doc, manufacturer_doc, batch_number)
         
-        supplier_file.save(supplier_path)
-        manufacturer_file.save(manufacturer_path)
-        
-        # Extract text using OCR
-        supplier_text = extract_text(supplier_path)
-        manufacturer_text = extract_text(manufacturer_path)
+        if run_async:
+            # Queue the pipeline and return immediately; clients poll /api/jobs/<job_id>
+            job_id = str(uuid.uuid4())
+            current_time = datetime.now().isoformat()
+            
+            conn = connect(DATABASE)
+            cursor = conn.cursor()
+            begin_write(conn)
+            cursor.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (job_id, 'queued', current_time, current_time)
+            )
+            conn.commit()
+            conn.close()
+            
+            analysis_executor.submit(run_analysis_job, job_id, *pipeline_args)
+            return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/api/jobs/{job_id}'}), 202
         
-        # Store documents in database
-        conn = sqlite3.connect(DATABASE)
+        _, analysis_result = run_analysis_pipeline(*pipeline_args)
+
+        # Return analysis result
+        return jsonify(analysis_result)
+    
+    except Exception as e:
+        print(f"Error processing documents: {e}")
+        return jsonify({'error': 'An error occurred while processing the documents'}), 500
+
+# Job status route for asynchronous analysis
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        conn = connect(DATABASE)
+        conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        current_time = datetime.now().isoformat()
-        
-        # Insert supplier document
-        cursor.execute(
-            "INSERT INTO documents (id, filename, document_type, batch_reference, upload_date, extracted_text, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (supplier_id, supplier_filename, 'supplier_coa', batch_number, current_time, supplier_text, supplier_path)
-        )
+        cursor.execute("""
+            SELECT j.id, j.status, j.created_at, j.updated_at, j.comparison_id, j.error, c.results_json
+            FROM jobs j
+            LEFT JOIN comparisons c ON j.comparison_id = c.id
+            WHERE j.id = ?
+        """, (job_id,))
+        row = cursor.fetchone()
+        conn.close()
         
-        # Insert manufacturer document
-        cursor.execute(
-            "INSERT INTO documents (id, filename, document_type, batch_reference, upload_date, extracted_text, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (manufacturer_id, manufacturer_filename, 'manufacturer_results', batch_number, current_time, manufacturer_text, manufacturer_path)
-        )
+        if not row:
+            return jsonify({'error': 'Job not found'}), 404
         
-        # Analyze documents
-        analysis_result = analyze_documents(supplier_text, manufacturer_text, batch_number)
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+        if row['status'] == 'completed':
+            job['comparison_id'] = row['comparison_id']
+            job['result'] = json.loads(row['results_json'])
+        elif row['status'] == 'failed':
+            job['error'] = row['error']
         
-        # Store comparison result
-        comparison_id = str(uuid.uuid4())
-        print(comparison_id)
-        cursor.execute(
-            "INSERT INTO comparisons (id, supplier_doc_id, manufacturer_doc_id, comparison_date, results_json) VALUES (?, ?, ?, ?, ?)",
-            (comparison_id, supplier_id, manufacturer_id, current_time, json.dumps(analysis_result))
-        )
+        return jsonify(job)
+    
+    except Exception as e:
+        print(f"Error retrieving job: {e}")
+        return jsonify({'error': 'An error occurred while retrieving the job'}), 500
+
+def validate_batch_manifest(manifest):
+    """Raise ValueError unless the manifest is a list of objects naming both files of each pair"""
+    if not isinstance(manifest, list):
+        raise ValueError("The batch manifest must be a list of document pairs")
+    for entry in manifest:
+        if not isinstance(entry, dict) or \
+                not all(isinstance(entry.get(key), str) for key in ('supplier_coa', 'manufacturer_results')):
+            raise ValueError("Each batch manifest entry must name its supplier_coa and manufacturer_results")
+    return manifest
+
+def remove_saved_documents(documents):
+    """Delete the uploaded files of documents that will not be stored"""
+    for document in documents:
+        if os.path.exists(document['path']):
+            os.remove(document['path'])
+
+def read_batch_manifest():
+    """
+    Save every document referenced by a batch request and return the list of pairs.
+    Accepts either a zip 'archive' containing manifest.json, or a 'manifest' form field
+    whose entries name the multipart file fields of each pair. If the request is invalid,
+    the documents already saved are removed before the error is raised.
+    """
+    pairs, saved = [], []
+    
+    def save(stream, filename):
+        document = save_uploaded_document(stream, filename)
+        saved.append(document)
+        return document
+    
+    try:
+        if 'archive' in request.files:
+            with zipfile.ZipFile(request.files['archive'].stream) as archive:
+                manifest = validate_batch_manifest(json.loads(archive.read('manifest.json')))
+                for entry in manifest:
+                    documents = []
+                    for key in ('supplier_coa', 'manufacturer_results'):
+                        member = entry[key]
+                        if not allowed_file(member):
+                            raise ValueError(f"Invalid file type: {member}")
+                        with archive.open(member) as stream:
+                            documents.append(save(stream, os.path.basename(member)))
+                    pairs.append((documents[0], documents[1], str(entry.get('batch_number') or '')))
+            return pairs
         
-        conn.commit()
-        conn.close()
+        manifest = validate_batch_manifest(json.loads(request.form.get('manifest', '[]')))
+        for entry in manifest:
+            documents = []
+            for key in ('supplier_coa', 'manufacturer_results'):
+                file = request.files.get(entry[key])
+                if file is None or file.filename == '' or not allowed_file(file.filename):
+                    raise ValueError(f"Missing or invalid file for field: {entry[key]}")
+                documents.append(save(file.stream, file.filename))
+            pairs.append((documents[0], documents[1], str(entry.get('batch_number') or '')))
+        return pairs
+    except Exception:
+        remove_saved_documents(saved)
+        raise
 
-        # Return analysis result
-        return jsonify(analysis_result)
+# Batch comparison route for many document pairs. The response is NDJSON: one line per pair as it
+# finishes, then a final line. Comparison ids on the pair lines are provisional; they are only
+# stored once the final line has status 'committed', which lists the stored ids.
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_batch_api():
+    try:
+        pairs = read_batch_manifest()
+    except (KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Error reading batch manifest: {e}")
+        return jsonify({'error': 'Invalid batch manifest'}), 400
     
-    except Exception as e:
-        print(f"Error processing documents: {e}")
-        return jsonify({'error': 'An error occurred while processing the documents'}), 500
+    if not pairs:
+        return jsonify({'error': 'The batch manifest contains no document pairs'}), 400
+    
+    def generate():
+        completed = []
+        committed = False
+        
+        try:
+            # Extract and analyze pairs concurrently, streaming each result as soon as it is ready
+            with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(pairs))) as executor:
+                futures = {executor.submit(extract_and_analyze, *pair): index for index, pair in enumerate(pairs)}
+                for future in as_completed(futures):
+                    index = futures[future]
+                    supplier_doc, manufacturer_doc, batch_number = pairs[index]
+                    try:
+                        supplier_text, manufacturer_text, analysis_result = future.result()
+                    except Exception as e:
+                        print(f"Error processing batch pair {index}: {e}")
+                        remove_saved_documents((supplier_doc, manufacturer_doc))
+                        yield json.dumps({'index': index, 'batch_number': batch_number, 'status': 'failed',
+                                          'error': 'An error occurred while processing the documents'}) + "\n"
+                        continue
+                    
+                    comparison_id = str(uuid.uuid4())
+                    completed.append((comparison_id, supplier_doc, supplier_text, manufacturer_doc, manufacturer_text,
+                                      batch_number, analysis_result))
+                    yield json.dumps({'index': index, 'batch_number': batch_number, 'status': 'completed',
+                                      'comparison_id': comparison_id, 'result': analysis_result}) + "\n"
+            
+            # Persist every completed pair in a single transaction
+            try:
+                save_comparisons(DATABASE, completed)
+                committed = True
+                yield json.dumps({'status': 'committed', 'comparisons': len(completed),
+                                  'comparison_ids': [comparison[0] for comparison in completed],
+                                  'failed': len(pairs) - len(completed)}) + "\n"
+            except Exception as e:
+                print(f"Error storing batch results: {e}")
+                yield json.dumps({'status': 'error', 'comparison_ids': [],
+                                  'error': 'An error occurred while storing the batch results; no comparison ids were stored'}) + "\n"
+        finally:
+            # Nothing references the files of an uncommitted batch, including one whose client disconnected
+            if not committed:
+                remove_saved_documents([document for pair in pairs for document in pair[:2]])
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 # Search route for historical reports
 @app.route('/api/search/<batch_reference>', methods=['GET'])
@@ -364,44 +472,116 @@ def search_reports(batch_reference):
     if not batch_reference:
         return jsonify({'error': 'Batch reference is required'}), 400
     
+    # Keyset pagination: ?limit=<n>&cursor=<next_cursor from the previous page>
+    # Summary mode (?summary=true) returns metadata only and skips results_json
+    summary = request.args.get('summary', '').lower() in ('1', 'true', 'yes')
+    
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = connect(DATABASE)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Query for comparisons with the given batch reference
-        cursor.execute("""
-            SELECT c.id, c.comparison_date, c.results_json, 
-                   s.filename as supplier_filename, m.filename as manufacturer_filename
-            FROM comparisons c
-            JOIN documents s ON c.supplier_doc_id = s.id
-            JOIN documents m ON c.manufacturer_doc_id = m.id
-            WHERE s.batch_reference = ? OR m.batch_reference = ?
-            ORDER BY c.comparison_date DESC
-        """, (batch_reference, batch_reference))
+        # Query for one page of comparisons with the given batch reference
+        try:
+            rows, next_cursor = search_comparisons_page(
+                cursor, batch_reference,
+                limit=request.args.get('limit', SEARCH_PAGE_SIZE),
+                after=request.args.get('cursor'),
+                summary=summary
+            )
+        except ValueError:
+            conn.close()
+            return jsonify({'error': 'Invalid limit or cursor'}), 400
         
         results = []
-        for row in cursor.fetchall():
-            results.append({
+        for row in rows:
+            result = {
                 'id': row['id'],
                 'date': row['comparison_date'],
                 'supplier_file': row['supplier_filename'],
-                'manufacturer_file': row['manufacturer_filename'],
-                'results': json.loads(row['results_json'])
-            })
+                'manufacturer_file': row['manufacturer_filename']
+            }
+            if not summary:
+                result['results'] = json.loads(row['results_json'])
+            results.append(result)
         
         conn.close()
-        return jsonify(results)
+        return jsonify({'results': results, 'next_cursor': next_cursor})
     
     except Exception as e:
         print(f"Error searching reports: {e}")
         return jsonify({'error': 'An error occurred while searching for reports'}), 500
 
+# Search route with selectable mode: ?mode=batch&batch_reference=... or ?mode=text&q=...
+@app.route('/api/search', methods=['GET'])
+def search_api():
+    mode = request.args.get('mode', 'batch')
+    
+    if mode == 'batch':
+        return search_reports(request.args.get('batch_reference', ''))
+    
+    if mode != 'text':
+        return jsonify({'error': 'Unknown search mode'}), 400
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search text is required'}), 400
+    
+    try:
+        conn = connect(DATABASE)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        # Ranked full-text matches over extracted text, filenames and product names
+        try:
+            rows = search_documents_text(cursor, query, request.args.get('limit', TEXT_SEARCH_LIMIT))
+        except ValueError:
+            conn.close()
+            return jsonify({'error': 'Invalid limit'}), 400
+        
+        results = []
+        for row in rows:
+            results.append({
+                'document_id': row['id'],
+                'filename': row['filename'],
+                'document_type': row['document_type'],
+                'batch_reference': row['batch_reference'],
+                'upload_date': row['upload_date'],
+                'product': row['product'],
+                'comparison_id': row['comparison_id'],
+                'snippet': highlight_snippet(row['snippet'])
+            })
+        
+        conn.close()
+        return jsonify({'results': results})
+    
+    except Exception as e:
+        print(f"Error searching document text: {e}")
+        return jsonify({'error': 'An error occurred while searching documents'}), 500
+
+# Full extracted text of a document, e.g. one found by text search
+@app.route('/api/document/<document_id>/text', methods=['GET'])
+def get_document_text_api(document_id):
+    try:
+        conn = connect(DATABASE)
+        cursor = conn.cursor()
+        text = get_document_text(cursor, document_id)
+        conn.close()
+        
+        if text is None:
+            return jsonify({'error': 'Document not found'}), 404
+        
+        return jsonify({'document_id': document_id, 'extracted_text': text})
+    
+    except Exception as e:
+        print(f"Error retrieving document text: {e}")
+        return jsonify({'error': 'An error occurred while retrieving the document text'}), 500
+
 # Get specific report by ID
 @app.route('/api/report/<report_id>', methods=['GET'])
 def get_report(report_id):
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = connect(DATABASE)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -418,5 +598,105 @@ def get_report(report_id):
         print(f"Error retrieving report: {e}")
         return jsonify({'error': 'An error occurred while retrieving the report'}), 500
 
+# Rendered PDF reports are stored on disk per comparison and template version, so clients
+# revalidate with If-None-Match and only download the file again after a template change
+@app.route('/api/report/<report_id>/pdf', methods=['GET'])
+def get_report_pdf(report_id):
+    etag = report_etag(report_id)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    try:
+        conn = connect(DATABASE)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT results_json FROM comparisons WHERE id = ?", (report_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return jsonify({'error': 'Report not found'}), 404
+        
+        report_data = json.loads(row['results_json'])
+        path = get_report_artifact(report_id, report_data)
+        if not path:
+            return jsonify({'error': 'An error occurred while rendering the report'}), 500
+        
+        response = send_file(path, mimetype='application/pdf', as_attachment=True,
+                             download_name=f"CoA_Report_{secure_filename(report_data['batch_info']['batch_reference'])}.pdf",
+                             etag=False, conditional=False)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    except Exception as e:
+        print(f"Error retrieving report PDF: {e}")
+        return jsonify({'error': 'An error occurred while retrieving the report'}), 500
+
+# Bulk export of rendered reports as a zip streamed while it is written, e.g.
+# /api/export/reports?from=2026-07-01&to=2026-10-01&status=APPROVED&product=Paracetamol
+@app.route('/api/export/reports', methods=['GET'])
+def export_reports():
+    archive = stream_report_archive(
+        DATABASE,
+        date_from=request.args.get('from'),
+        date_to=request.args.get('to'),
+        status=request.args.get('status'),
+        product=request.args.get('product')
+    )
+    filename = f"CoA_Reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return Response(stream_with_context(archive), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# Aggregate queries over comparison line items, e.g.
+# /api/analytics/items?parameter=Purity&status=NON-COMPLIANT&from=2026-07-01&to=2026-10-01&group_by=month
+# Average values are only returned per unit, e.g. /api/analytics/items?parameter=Purity&group_by=unit,month
+@app.route('/api/analytics/items', methods=['GET'])
+def comparison_item_analytics():
+    group_by = [column.strip() for column in request.args.get('group_by', 'status').split(',') if column.strip()]
+    
+    try:
+        conn = connect(DATABASE)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        try:
+            rows = aggregate_comparison_items(
+                cursor, group_by,
+                category=request.args.get('category'),
+                parameter=request.args.get('parameter'),
+                status=request.args.get('status'),
+                date_from=request.args.get('from'),
+                date_to=request.args.get('to')
+            )
+        except ValueError as e:
+            conn.close()
+            return jsonify({'error': str(e)}), 400
+        
+        results = [dict(row) for row in rows]
+        conn.close()
+        return jsonify(results)
+    
+    except Exception as e:
+        print(f"Error aggregating comparison items: {e}")
+        return jsonify({'error': 'An error occurred while aggregating comparison results'}), 500
+
+# Cache hit/miss statistics
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    try:
+        return jsonify(get_cache_stats(DATABASE))
+    except Exception as e:
+        print(f"Error retrieving cache statistics: {e}")
+        return jsonify({'error': 'An error occurred while retrieving cache statistics'}), 500
+
+# LLM call latency and HTTP connection reuse for this process
+@app.route('/api/llm/stats', methods=['GET'])
+def llm_stats():
+    return jsonify(get_llm_stats())
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
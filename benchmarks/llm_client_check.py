@@ -0,0 +1,116 @@
+# llm_client_check.py
+"""
+Check LLM client reuse against a local mock of the Groq chat completions API.
+
+Starts a keep-alive HTTP/1.1 server that answers every POST with a canned chat
+completion after RESPONSE_DELAY_MS, then makes CALLS calls from THREADS threads:
+first constructing a new ChatGroq per call (the previous behaviour), then through
+llm.invoke_llm. Reports the TCP connections the server accepted, mean latency and
+llm.get_llm_stats(), and fails if the shared client opened more connections than
+there were threads.
+
+Usage: python benchmarks/llm_client_check.py [calls] [threads]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CALLS = 200
+THREADS = 8
+RESPONSE_DELAY_MS = 5
+MODEL_NAME = "llama-3.1-8b-instant"
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-mock",
+    "object": "chat.completion",
+    "created": 0,
+    "model": MODEL_NAME,
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+}).encode("utf-8")
+
+accepted_connections = 0
+accepted_lock = threading.Lock()
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        global accepted_connections
+        with accepted_lock:
+            accepted_connections += 1
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(RESPONSE_DELAY_MS / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_calls(call, calls, threads):
+    """Run call() calls times across threads; return (connections accepted, mean latency ms)"""
+    global accepted_connections
+    accepted_connections = 0
+
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(timed, range(calls)))
+    return accepted_connections, sum(latencies) / len(latencies) * 1000
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else CALLS
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else THREADS
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # llm reads its configuration at import time
+    os.environ["GROQ_API_BASE"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "mock-key")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from langchain_groq import ChatGroq
+    from langchain.schema import HumanMessage
+    from llm import invoke_llm, get_llm_stats
+
+    messages = [HumanMessage(content="ping")]
+
+    def per_call_client():
+        ChatGroq(temperature=0, model_name=MODEL_NAME, base_url=base_url).invoke(messages)
+
+    def shared_client():
+        invoke_llm(MODEL_NAME, messages)
+
+    baseline_connections, baseline_ms = run_calls(per_call_client, calls, threads)
+    print(f"New client per call:  {baseline_connections:5d} connections, {baseline_ms:8.2f} ms/call")
+    shared_connections, shared_ms = run_calls(shared_client, calls, threads)
+    print(f"Shared client:        {shared_connections:5d} connections, {shared_ms:8.2f} ms/call")
+
+    stats = get_llm_stats()
+    print(json.dumps(stats, indent=2))
+    server.shutdown()
+
+    assert stats["calls"] == calls and stats["errors"] == 0, "Shared client calls failed"
+    assert stats["new_connections"] == shared_connections, "Instrumentation disagrees with the server"
+    assert shared_connections <= threads, "Shared client did not reuse connections"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# report_benchmark.py
+"""
+Benchmark PDF report rendering throughput.
+
+Renders NUM_REPORTS synthetic compliance reports with reports.create_pdf_report,
+first in a single thread and then across a process pool (as bulk export does),
+and prints reports per second for each.
+
+Usage: python benchmarks/report_benchmark.py [num_reports] [workers]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from reports import create_pdf_report
+
+NUM_REPORTS = 500
+WORKERS = os.cpu_count() or 1
+ROWS_PER_SECTION = 8
+STATUSES = ["MATCH", "WITHIN TOLERANCE", "NON-COMPLIANT", "COMPLIANT"]
+
+
+def synthetic_report(index):
+    """Build analysis results shaped like the LLM output"""
+    def section(key_name):
+        return [
+            {
+                key_name: f"{key_name.capitalize()} {row}",
+                "supplier_result": f"{99.0 + row / 10:.1f}%",
+                "manufacturer_result": f"{99.1 + row / 10:.1f}%",
+                "status": STATUSES[(index + row) % len(STATUSES)]
+            }
+            for row in range(ROWS_PER_SECTION)
+        ]
+
+    return {
+        "batch_info": {
+            "batch_reference": f"BATCH-{index:07d}",
+            "supplier_batch": f"SUP-{index:07d}",
+            "product": "Synthetic Product",
+            "comparison_date": "2026-01-01"
+        },
+        "physical_characteristics": section("parameter"),
+        "chemical_analysis": section("test"),
+        "microbiological_testing": section("parameter"),
+        "compliance_summary": {
+            "overall_compliance": "FULLY COMPLIANT" if index % 2 else "NON-COMPLIANT",
+            "variation_tolerance": "5%",
+            "batch_approval_status": "APPROVED" if index % 2 else "REJECTED"
+        },
+        "certification": {
+            "certified_by": "QA Analyst",
+            "reviewed_by": "QA Manager",
+            "certification_number": f"CERT-{index:07d}",
+            "certification_date": "2026-01-01"
+        }
+    }
+
+
+def render_serial(reports):
+    """Return reports per second rendering in the calling thread"""
+    start = time.perf_counter()
+    for data in reports:
+        assert create_pdf_report(data), "Report rendering failed"
+    return len(reports) / (time.perf_counter() - start)
+
+
+def render_pool(reports, workers):
+    """Return reports per second rendering across a process pool, excluding pool startup"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm every worker so imports and style construction are not timed
+        list(pool.map(create_pdf_report, reports[:workers]))
+        start = time.perf_counter()
+        for pdf_bytes in pool.map(create_pdf_report, reports, chunksize=8):
+            assert pdf_bytes, "Report rendering failed"
+        return len(reports) / (time.perf_counter() - start)
+
+
+def main():
+    num_reports = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REPORTS
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else WORKERS
+    reports = [synthetic_report(i) for i in range(num_reports)]
+
+    serial_rate = render_serial(reports)
+    print(f"{'Single thread:':28}{serial_rate:10.1f} reports/s")
+    pool_rate = render_pool(reports, workers)
+    print(f"{f'Process pool ({workers} workers):':28}{pool_rate:10.1f} reports/s")
+    print(f"{'Pool speedup:':28}{pool_rate / serial_rate:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
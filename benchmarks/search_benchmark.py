@@ -0,0 +1,136 @@
+# search_benchmark.py
+"""
+Benchmark batch reference search on a synthetic database.
+
+Builds a database with the application schema and NUM_DOCUMENTS documents
+(half supplier, half manufacturer, paired into comparisons), then times the
+original OR-join query without indexes against the paginated UNION query the
+search endpoint runs (search_comparisons_page, first page).
+
+Usage: python benchmarks/search_benchmark.py [num_documents] [database_path]
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from db import apply_migrations, search_comparisons_page
+
+NUM_DOCUMENTS = 1_000_000
+RERUNS_PER_BATCH = 5  # Comparisons sharing a batch reference
+QUERIES = 50
+
+ORIGINAL_SEARCH_SQL = """
+    SELECT c.id, c.comparison_date, c.results_json,
+           s.filename as supplier_filename, m.filename as manufacturer_filename
+    FROM comparisons c
+    JOIN documents s ON c.supplier_doc_id = s.id
+    JOIN documents m ON c.manufacturer_doc_id = m.id
+    WHERE s.batch_reference = ? OR m.batch_reference = ?
+    ORDER BY c.comparison_date DESC
+"""
+
+
+def build_database(path, num_documents):
+    """Create the schema without indexes and fill it with synthetic rows"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE documents (
+        id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        document_type TEXT NOT NULL,
+        batch_reference TEXT NOT NULL,
+        upload_date TIMESTAMP NOT NULL,
+        extracted_text TEXT,
+        file_path TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE comparisons (
+        id TEXT PRIMARY KEY,
+        supplier_doc_id TEXT NOT NULL,
+        manufacturer_doc_id TEXT NOT NULL,
+        comparison_date TIMESTAMP NOT NULL,
+        results_json TEXT NOT NULL
+    )
+    ''')
+
+    start = datetime(2020, 1, 1)
+    num_comparisons = num_documents // 2
+    documents = []
+    comparisons = []
+    for i in range(num_comparisons):
+        batch = f"BATCH-{i // RERUNS_PER_BATCH:07d}"
+        date = (start + timedelta(minutes=i)).isoformat()
+        supplier_id, manufacturer_id = f"s{i}", f"m{i}"
+        documents.append((supplier_id, "supplier.pdf", "supplier_coa", batch, date, "text", "uploads/s.pdf"))
+        documents.append((manufacturer_id, "manufacturer.pdf", "manufacturer_results", batch, date, "text", "uploads/m.pdf"))
+        comparisons.append((f"c{i}", supplier_id, manufacturer_id, date, '{"batch_info": {}}'))
+    cursor.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)", documents)
+    cursor.executemany("INSERT INTO comparisons VALUES (?, ?, ?, ?, ?)", comparisons)
+    conn.commit()
+    return conn, num_comparisons // RERUNS_PER_BATCH
+
+
+def time_search(batches, search):
+    """Return mean milliseconds per search and the rows returned for the first batch"""
+    first_rows = None
+    start = time.perf_counter()
+    for batch in batches:
+        rows = search(batch)
+        if first_rows is None:
+            first_rows = rows
+    elapsed = time.perf_counter() - start
+    return elapsed / len(batches) * 1000, first_rows
+
+
+def time_query(conn, sql, batches):
+    """Time a query taking the batch reference for both documents"""
+    cursor = conn.cursor()
+    return time_search(batches, lambda batch: cursor.execute(sql, (batch, batch)).fetchall())
+
+
+def time_search_page(conn, batches):
+    """Time the first page of search_comparisons_page, as served by the search endpoint"""
+    cursor = conn.cursor()
+    return time_search(batches, lambda batch: search_comparisons_page(cursor, batch)[0])
+
+
+def main():
+    num_documents = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_DOCUMENTS
+    path = sys.argv[2] if len(sys.argv) > 2 else "search_benchmark.db"
+
+    print(f"Building synthetic database with {num_documents:,} documents...")
+    conn, num_batches = build_database(path, num_documents)
+    random.seed(0)
+    batches = [f"BATCH-{random.randrange(num_batches):07d}" for _ in range(QUERIES)]
+
+    # Few queries without indexes: each one scans the full comparisons table
+    before_ms, before_rows = time_query(conn, ORIGINAL_SEARCH_SQL, batches[:5])
+    print(f"Original query, no indexes:  {before_ms:10.2f} ms/search")
+
+    cursor = conn.cursor()
+    apply_migrations(cursor)
+    conn.commit()
+    cursor.execute("ANALYZE")
+
+    or_ms, _ = time_query(conn, ORIGINAL_SEARCH_SQL, batches)
+    print(f"Original query, indexes:     {or_ms:10.2f} ms/search")
+    after_ms, after_rows = time_search_page(conn, batches)
+    print(f"Paged UNION query, indexes:  {after_ms:10.2f} ms/search")
+
+    assert before_rows == after_rows, "Rewritten query returned different rows"
+    print(f"Speedup over original:       {before_ms / after_ms:10.1f}x")
+
+    conn.close()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
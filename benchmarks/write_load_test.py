@@ -0,0 +1,132 @@
+# write_load_test.py
+"""
+Load test concurrent comparison writes against SQLite.
+
+WRITERS threads each store TRANSACTIONS_PER_WRITER comparisons (two document
+rows plus one comparison row per transaction, as the upload pipeline does).
+The baseline opens a fresh default connection per transaction with the
+rollback journal; the pooled run uses db.connect() (WAL, tuned pragmas) and
+db.begin_write(). Reports throughput and "database is locked" failures.
+
+Usage: python benchmarks/write_load_test.py [writers] [transactions_per_writer]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from db import connect, begin_write, apply_migrations
+
+WRITERS = 32
+TRANSACTIONS_PER_WRITER = 50
+EXTRACTED_TEXT = "Assay 99.5% Water content 0.2% Total aerobic count <10 CFU/g " * 40
+RESULTS_JSON = json.dumps({"batch_info": {"product": "Synthetic Product"}})
+
+
+def create_schema(path):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE documents (
+        id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        document_type TEXT NOT NULL,
+        batch_reference TEXT NOT NULL,
+        upload_date TIMESTAMP NOT NULL,
+        extracted_text TEXT,
+        file_path TEXT NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE comparisons (
+        id TEXT PRIMARY KEY,
+        supplier_doc_id TEXT NOT NULL,
+        manufacturer_doc_id TEXT NOT NULL,
+        comparison_date TIMESTAMP NOT NULL,
+        results_json TEXT NOT NULL
+    )
+    ''')
+    apply_migrations(cursor)
+    conn.commit()
+    conn.close()
+
+
+def write_comparison(cursor, batch):
+    now = datetime.now().isoformat()
+    supplier_id, manufacturer_id = str(uuid.uuid4()), str(uuid.uuid4())
+    for doc_id, doc_type in ((supplier_id, "supplier_coa"), (manufacturer_id, "manufacturer_results")):
+        cursor.execute(
+            "INSERT INTO documents (id, filename, document_type, batch_reference, upload_date, extracted_text, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (doc_id, f"{doc_type}.pdf", doc_type, batch, now, EXTRACTED_TEXT, f"uploads/{doc_id}.pdf")
+        )
+    cursor.execute(
+        "INSERT INTO comparisons (id, supplier_doc_id, manufacturer_doc_id, comparison_date, results_json) VALUES (?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), supplier_id, manufacturer_id, now, RESULTS_JSON)
+    )
+
+
+def baseline_transaction(path, batch):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    write_comparison(cursor, batch)
+    conn.commit()
+    conn.close()
+
+
+def pooled_transaction(path, batch):
+    conn = connect(path)
+    cursor = conn.cursor()
+    begin_write(conn)
+    write_comparison(cursor, batch)
+    conn.commit()
+    conn.close()
+
+
+def run(label, transaction, path, writers, per_writer):
+    errors = []
+    barrier = threading.Barrier(writers)
+
+    def writer(index):
+        barrier.wait()
+        for i in range(per_writer):
+            try:
+                transaction(path, f"BATCH-{index}-{i}")
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    committed = writers * per_writer - len(errors)
+    print(f"{label:<28} {committed / elapsed:8.1f} comparisons/s  "
+          f"{committed:5d} committed  {len(errors):4d} failed  ({elapsed:.2f}s)")
+
+
+def main():
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else WRITERS
+    per_writer = int(sys.argv[2]) if len(sys.argv) > 2 else TRANSACTIONS_PER_WRITER
+    print(f"{writers} concurrent writers x {per_writer} comparisons each")
+
+    with tempfile.TemporaryDirectory() as directory:
+        baseline_path = os.path.join(directory, "baseline.db")
+        pooled_path = os.path.join(directory, "pooled.db")
+        create_schema(baseline_path)
+        create_schema(pooled_path)
+
+        run("Per-call connect, rollback", baseline_transaction, baseline_path, writers, per_writer)
+        run("Pooled connect, WAL", pooled_transaction, pooled_path, writers, per_writer)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+# cache.py
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timedelta
+from db import connect, begin_write, compress_text, decompress_text
+
+# Extraction cache configuration
+EXTRACTION_CACHE_VERSION = 3  # Bump when extraction output changes so stale entries are ignored
+EXTRACTION_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Total extracted text kept in the cache
+EXTRACTION_CACHE_MAX_AGE_DAYS = 90  # Entries not used for this long are evicted
+
+# LLM response cache configuration
+LLM_CACHE_MAX_ENTRIES = 10000
+LLM_CACHE_MAX_AGE_DAYS = 180
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def init_cache_tables(cursor):
+    """Create cache tables alongside the application tables"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS extraction_cache (
+        content_hash TEXT PRIMARY KEY,
+        extractor_version INTEGER NOT NULL,
+        extracted_text TEXT NOT NULL,
+        text_size INTEGER NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        last_accessed TIMESTAMP NOT NULL
+    )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_accessed ON extraction_cache (last_accessed)"
+    )
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        model_name TEXT NOT NULL,
+        results_json TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        last_accessed TIMESTAMP NOT NULL,
+        hit_count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache (last_accessed)"
+    )
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        cache_name TEXT PRIMARY KEY,
+        hits INTEGER NOT NULL DEFAULT 0,
+        misses INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+
+def file_sha256(file_path):
+    """Compute the SHA-256 of a file without loading it fully into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_cached_text(database, content_hash):
+    """Return cached extracted text for a content hash, or None on a miss"""
+    try:
+        conn = connect(database)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT extracted_text FROM extraction_cache WHERE content_hash = ? AND extractor_version = ?",
+            (content_hash, EXTRACTION_CACHE_VERSION)
+        )
+        row = cursor.fetchone()
+        if row:
+            begin_write(conn)
+            cursor.execute(
+                "UPDATE extraction_cache SET last_accessed = ? WHERE content_hash = ?",
+                (datetime.now().isoformat(), content_hash)
+            )
+            conn.commit()
+        conn.close()
+        if not row:
+            return None
+        # Entries are stored compressed; older entries hold plain text
+        return decompress_text(row[0]) if isinstance(row[0], bytes) else row[0]
+    except sqlite3.Error as e:
+        print(f"Error reading extraction cache: {e}")
+        return None
+
+
+def store_cached_text(database, content_hash, text):
+    """Store extracted text, compressed, for a content hash and apply eviction"""
+    try:
+        conn = connect(database)
+        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+        begin_write(conn)
+        cursor.execute(
+            "INSERT OR REPLACE INTO extraction_cache (content_hash, extractor_version, extracted_text, text_size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, EXTRACTION_CACHE_VERSION, compress_text(text), len(text.encode("utf-8")), now, now)
+        )
+        evict_extraction_cache(cursor)
+        conn.commit()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error writing extraction cache: {e}")
+
+
+def evict_extraction_cache(cursor, max_bytes=EXTRACTION_CACHE_MAX_BYTES, max_age_days=EXTRACTION_CACHE_MAX_AGE_DAYS):
+    """Drop stale entries, then the least recently used ones until the cache fits in max_bytes"""
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    cursor.execute(
+        "DELETE FROM extraction_cache WHERE last_accessed < ? OR extractor_version != ?",
+        (cutoff, EXTRACTION_CACHE_VERSION)
+    )
+    cursor.execute("""
+        DELETE FROM extraction_cache WHERE content_hash IN (
+            SELECT content_hash FROM (
+                SELECT content_hash,
+                       SUM(text_size) OVER (ORDER BY last_accessed DESC, content_hash) AS running_size
+                FROM extraction_cache
+            )
+            WHERE running_size > ?
+        )
+    """, (max_bytes,))
+
+
+def normalize_prompt_input(text):
+    """Collapse whitespace so formatting-only differences map to the same cache entry"""
+    return " ".join((text or "").split())
+
+
+def llm_cache_key(model_name, system_prompt, supplier_text, manufacturer_text, batch_reference):
+    """Build the LLM cache key from the model, the system prompt and the normalized inputs"""
+    payload = json.dumps([
+        model_name,
+        normalize_prompt_input(system_prompt),
+        normalize_prompt_input(supplier_text),
+        normalize_prompt_input(manufacturer_text),
+        normalize_prompt_input(batch_reference)
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def record_cache_event(cursor, cache_name, hit):
+    """Increment the hit or miss counter for a cache"""
+    column = "hits" if hit else "misses"
+    cursor.execute(
+        "INSERT OR IGNORE INTO cache_stats (cache_name, hits, misses) VALUES (?, 0, 0)",
+        (cache_name,)
+    )
+    cursor.execute(
+        f"UPDATE cache_stats SET {column} = {column} + 1 WHERE cache_name = ?",
+        (cache_name,)
+    )
+
+
+def get_cached_analysis(database, cache_key):
+    """Return a cached analysis result for a cache key, or None on a miss"""
+    try:
+        conn = connect(database)
+        cursor = conn.cursor()
+        cursor.execute("SELECT results_json FROM llm_cache WHERE cache_key = ?", (cache_key,))
+        row = cursor.fetchone()
+        begin_write(conn)
+        if row:
+            cursor.execute(
+                "UPDATE llm_cache SET last_accessed = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (datetime.now().isoformat(), cache_key)
+            )
+        record_cache_event(cursor, "llm", row is not None)
+        conn.commit()
+        conn.close()
+        return json.loads(row[0]) if row else None
+    except sqlite3.Error as e:
+        print(f"Error reading LLM cache: {e}")
+        return None
+
+
+def store_cached_analysis(database, cache_key, model_name, result):
+    """Store a validated analysis result and apply eviction"""
+    try:
+        conn = connect(database)
+        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+        begin_write(conn)
+        cursor.execute(
+            "INSERT OR REPLACE INTO llm_cache (cache_key, model_name, results_json, created_at, last_accessed, hit_count) VALUES (?, ?, ?, ?, ?, 0)",
+            (cache_key, model_name, json.dumps(result), now, now)
+        )
+        evict_llm_cache(cursor)
+        conn.commit()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Error writing LLM cache: {e}")
+
+
+def evict_llm_cache(cursor, max_entries=LLM_CACHE_MAX_ENTRIES, max_age_days=LLM_CACHE_MAX_AGE_DAYS):
+    """Drop stale entries, then the least recently used ones beyond max_entries"""
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    cursor.execute("DELETE FROM llm_cache WHERE last_accessed < ?", (cutoff,))
+    cursor.execute("""
+        DELETE FROM llm_cache WHERE cache_key IN (
+            SELECT cache_key FROM llm_cache
+            ORDER BY last_accessed DESC, cache_key
+            LIMIT -1 OFFSET ?
+        )
+    """, (max_entries,))
+
+
+def get_cache_stats(database):
+    """Return hit/miss counters and hit ratio per cache"""
+    conn = connect(database)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("SELECT cache_name, hits, misses FROM cache_stats")
+    stats = {}
+    for row in cursor.fetchall():
+        total = row['hits'] + row['misses']
+        stats[row['cache_name']] = {
+            'hits': row['hits'],
+            'misses': row['misses'],
+            'hit_ratio': row['hits'] / total if total else 0.0
+        }
+    conn.close()
+    return stats
@@ -0,0 +1,142 @@
+# compaction.py
+import re
+import math
+from rules import SECTION_HEADINGS, MAX_HEADING_LENGTH, HEADER_ROLES, CELL_SEPARATOR, normalize_label, header_roles
+
+# Separates pages in extracted PDF text; str.splitlines() treats it as a line break
+PAGE_BREAK = "\f"
+
+# Compaction configuration
+EDGE_LINES = 3  # Lines at the top and bottom of a page checked for repeated headers and footers
+PROSE_MIN_CHARS = 60  # Narrative lines at least this long, with no measurements, are dropped
+PROSE_MIN_WORDS = 8
+HEADING_MAX_WORDS = 6  # Longer short lines are sentences rather than headings
+CHARS_PER_TOKEN = 4  # Rough token estimate for reporting savings
+
+COLUMN_GAP_PATTERN = re.compile(r'[ \t]*\t[ \t]*| {2,}')
+PAGE_NUMBER_PATTERN = re.compile(r'^(?:page\s*)?#(?:\s*(?:of|/)\s*#)?$', re.IGNORECASE)
+ANALYTICAL_PATTERN = re.compile(r'\d|%|:|<|>|≤|≥')
+TITLE_SMALL_WORDS = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with", "&"}
+NON_ANALYTICAL_HEADINGS = re.compile(
+    r'^(?:disclaimer|legal notice|confidentiality notice|terms (?:and|&) conditions|storage(?: conditions)?|'
+    r'shipping(?: information)?|packaging|contact(?: us| information)?|revision history|distribution list)$',
+    re.IGNORECASE
+)
+
+
+def estimate_tokens(text):
+    """Approximate LLM token count of a text"""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def boilerplate_key(line):
+    """Compare header/footer lines with numbers masked, so "Page 2 of 5" matches "Page 3 of 5" """
+    return re.sub(r'\d+', '#', line.lower())
+
+
+def is_prose(line):
+    """Narrative text with no results in it, such as section introductions"""
+    return (len(line) >= PROSE_MIN_CHARS and len(line.split()) >= PROSE_MIN_WORDS
+            and not ANALYTICAL_PATTERN.search(line))
+
+
+def is_heading_like(line):
+    """A short title line with no results or column separators, which may start a section"""
+    return (len(line) <= MAX_HEADING_LENGTH and " | " not in line and line[:1].isupper()
+            and len(line.split()) <= HEADING_MAX_WORDS and not ANALYTICAL_PATTERN.search(line))
+
+
+def is_title_case(line):
+    """Heading style: every word capitalized apart from short joining words, and no closing period"""
+    return not line.endswith(".") and all(word[:1].isupper() or word.lower() in TITLE_SMALL_WORDS
+                                          for word in line.split())
+
+
+def compact_document_text(text):
+    """
+    Reduce extracted document text to what the analysis needs: collapse whitespace, drop page numbers,
+    header/footer lines repeated on later pages, narrative paragraphs and non-analytical sections.
+    Result tables, header fields and section headings are kept in order.
+    """
+    # Runs of spaces or tabs separate table columns, so they become a single " | "
+    pages = [[COLUMN_GAP_PATTERN.sub(" | ", line.strip()) for line in page.splitlines()]
+             for page in str(text or "").split(PAGE_BREAK)]
+    pages = [[line for line in page if line] for page in pages]
+
+    # Header/footer lines that recur at the edges of several pages
+    edge_counts = {}
+    for page in pages:
+        for key in {boilerplate_key(line) for line in page[:EDGE_LINES] + page[-EDGE_LINES:]}:
+            edge_counts[key] = edge_counts.get(key, 0) + 1
+    repeated = {key for key, count in edge_counts.items() if count >= 2} if len(pages) >= 2 else set()
+
+    kept, seen_repeated = [], set()
+    skipping_section, previous_dropped = False, False
+    header_cells, in_cell_table, in_result_section, resume_result_section = 0, False, False, False
+    table_started = False
+    for page in pages:
+        for position, line in enumerate(page):
+            key = boilerplate_key(line)
+            if PAGE_NUMBER_PATTERN.match(key):
+                continue
+            at_edge = position < EDGE_LINES or position >= len(page) - EDGE_LINES
+            if key in repeated and at_edge and " | " not in line:
+                # Keep the first occurrence, which is often the company or document name; table rows
+                # are never boilerplate, since different pages can report identical results
+                if key in seen_repeated:
+                    continue
+                seen_repeated.add(key)
+
+            # Tables extracted one cell per line start with a run of header cells; their cells are
+            # not headings until the next result section starts
+            header_cells = header_cells + 1 if normalize_label(line) in HEADER_ROLES else 0
+            section = next((category for pattern, category in SECTION_HEADINGS if pattern.match(line)), False) \
+                if len(line) <= MAX_HEADING_LENGTH else False
+            table_header = header_roles(CELL_SEPARATOR.split(line))
+            if section is not False:
+                in_cell_table, in_result_section, table_started = False, section is not None, False
+            elif header_cells >= 2:
+                in_cell_table = True
+            if in_cell_table or table_header:
+                table_started = True
+
+            if is_heading_like(line) and not in_cell_table and NON_ANALYTICAL_HEADINGS.match(line):
+                # An unrecognized heading that ends the skip continues the result section it interrupted
+                if not skipping_section:
+                    resume_result_section = in_result_section
+                skipping_section, in_result_section = True, False
+                continue
+            # A skipped section ends at a known section heading, at a Title Case heading such as
+            # "Residual Solvents", or at a results table header; sentences inside it never end it
+            if skipping_section and (section is not False or table_header
+                                     or (is_heading_like(line) and is_title_case(line))):
+                skipping_section = False
+                if section is False:
+                    in_result_section = resume_result_section
+            if skipping_section:
+                continue
+
+            # Drop narrative paragraphs, including the short last line of a wrapped sentence. Once a result
+            # section's table has started, long lines can be specification or result cells, so they are kept
+            if in_cell_table or (in_result_section and table_started):
+                previous_dropped = False
+                kept.append(line)
+                continue
+            if is_prose(line) or (previous_dropped and line[:1].islower() and not ANALYTICAL_PATTERN.search(line)):
+                previous_dropped = True
+                continue
+            previous_dropped = False
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def compact_prompt_inputs(supplier_text, manufacturer_text):
+    """
+    Compact both documents for an LLM prompt.
+    Returns (supplier_text, manufacturer_text, tokens_before, tokens_after).
+    """
+    compacted_supplier = compact_document_text(supplier_text)
+    compacted_manufacturer = compact_document_text(manufacturer_text)
+    tokens_before = estimate_tokens(supplier_text) + estimate_tokens(manufacturer_text)
+    tokens_after = estimate_tokens(compacted_supplier) + estimate_tokens(compacted_manufacturer)
+    return compacted_supplier, compacted_manufacturer, tokens_before, tokens_after
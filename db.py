@@ -0,0 +1,702 @@
+# db.py
+import base64
+import binascii
+import html
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from measurements import parse_measurement, normalize_unit
+
+# Connection management
+POOL_MAX_IDLE = 8  # Idle connections kept open per database
+BUSY_TIMEOUT_MS = 10000  # How long SQLite itself waits on a locked database
+WRITE_LOCK_RETRIES = 5  # Extra attempts to take the write lock after the busy timeout expires
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",  # Readers no longer block the writer or each other
+    "PRAGMA synchronous = NORMAL",  # Safe with WAL; fsync at checkpoints instead of every commit
+    "PRAGMA cache_size = -65536",  # 64MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+]
+
+# Extracted text storage: "compressed" keeps OCR text zlib-compressed in document_text,
+# out of the documents table; "inline" stores it in documents.extracted_text as before.
+# documents_fts still keeps its own uncompressed copy, because snippet() reads the indexed text.
+TEXT_STORAGE = os.getenv("TEXT_STORAGE", "compressed")
+TEXT_COMPRESSION_LEVEL = 6
+
+# Result sections stored as comparison line items, with the key naming each row's parameter
+COMPARISON_SECTIONS = {
+    "physical_characteristics": "parameter",
+    "chemical_analysis": "test",
+    "microbiological_testing": "parameter",
+}
+
+# Columns line-item aggregates may be grouped by
+ITEM_GROUP_COLUMNS = {
+    "category": "category",
+    "parameter": "parameter",
+    "status": "status",
+    "unit": "unit",
+    "month": "substr(comparison_date, 1, 7)",
+}
+
+# Compliance rollups: product and supplier count comparisons (passed = batch approved),
+# parameter counts line items (passed = any status but NON-COMPLIANT)
+ROLLUP_DIMENSIONS = ("product", "supplier", "parameter")
+ROLLUP_UNKNOWN = "Unknown"
+
+# Search pagination
+SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_PAGE_SIZE = 500
+
+# Full-text search
+TEXT_SEARCH_LIMIT = 50
+SNIPPET_TOKENS = 16
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"  # char(2)/char(3) match markers, replaced after HTML escaping
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: Index batch reference lookups and the comparison joins used by search
+    [
+        "CREATE INDEX IF NOT EXISTS idx_documents_batch_reference ON documents (batch_reference)",
+        "CREATE INDEX IF NOT EXISTS idx_comparisons_supplier_doc ON comparisons (supplier_doc_id)",
+        "CREATE INDEX IF NOT EXISTS idx_comparisons_manufacturer_doc ON comparisons (manufacturer_doc_id)",
+        "CREATE INDEX IF NOT EXISTS idx_comparisons_date ON comparisons (comparison_date)",
+    ],
+    # 2: Full-text index over extracted text, filenames and product names, kept in sync by triggers.
+    # documents has a TEXT primary key, so documents_fts_map links each document to its FTS row.
+    [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(filename, product, extracted_text)",
+        """
+        CREATE TABLE IF NOT EXISTS documents_fts_map (
+            document_id TEXT PRIMARY KEY,
+            fts_rowid INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_fts (filename, product, extracted_text)
+            VALUES (NEW.filename, '', COALESCE(NEW.extracted_text, ''));
+            INSERT INTO documents_fts_map (document_id, fts_rowid) VALUES (NEW.id, last_insert_rowid());
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+            DELETE FROM documents_fts
+            WHERE rowid = (SELECT fts_rowid FROM documents_fts_map WHERE document_id = OLD.id);
+            DELETE FROM documents_fts_map WHERE document_id = OLD.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS documents_fts_product AFTER INSERT ON comparisons BEGIN
+            UPDATE documents_fts
+            SET product = COALESCE(json_extract(NEW.results_json, '$.batch_info.product'), '')
+            WHERE rowid IN (
+                SELECT fts_rowid FROM documents_fts_map
+                WHERE document_id IN (NEW.supplier_doc_id, NEW.manufacturer_doc_id)
+            );
+        END
+        """,
+        # Backfill documents stored before the index existed
+        """
+        INSERT INTO documents_fts (rowid, filename, product, extracted_text)
+        SELECT d.rowid, d.filename,
+               COALESCE((SELECT json_extract(c.results_json, '$.batch_info.product') FROM comparisons c
+                         WHERE c.supplier_doc_id = d.id OR c.manufacturer_doc_id = d.id
+                         ORDER BY c.comparison_date DESC LIMIT 1), ''),
+               COALESCE(d.extracted_text, '')
+        FROM documents d
+        """,
+        "INSERT INTO documents_fts_map (document_id, fts_rowid) SELECT id, rowid FROM documents",
+    ],
+    # 3: Compressed extracted text kept outside the documents table
+    [
+        """
+        CREATE TABLE IF NOT EXISTS document_text (
+            document_id TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            original_size INTEGER NOT NULL,
+            content BLOB NOT NULL,
+            FOREIGN KEY (document_id) REFERENCES documents (id)
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS document_text_delete AFTER DELETE ON documents BEGIN
+            DELETE FROM document_text WHERE document_id = OLD.id;
+        END
+        """,
+    ],
+    # 4: Queryable comparison line items alongside results_json
+    [
+        """
+        CREATE TABLE IF NOT EXISTS comparison_items (
+            id INTEGER PRIMARY KEY,
+            comparison_id TEXT NOT NULL,
+            comparison_date TIMESTAMP NOT NULL,
+            category TEXT NOT NULL,
+            parameter TEXT NOT NULL COLLATE NOCASE,
+            supplier_result TEXT,
+            manufacturer_result TEXT,
+            supplier_value REAL,
+            manufacturer_value REAL,
+            unit TEXT,
+            status TEXT NOT NULL,
+            FOREIGN KEY (comparison_id) REFERENCES comparisons (id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_comparison_items_parameter ON comparison_items (parameter, status, comparison_date)",
+        "CREATE INDEX IF NOT EXISTS idx_comparison_items_status ON comparison_items (status, comparison_date)",
+        "CREATE INDEX IF NOT EXISTS idx_comparison_items_comparison ON comparison_items (comparison_id)",
+        lambda cursor: backfill_comparison_items(cursor),
+    ],
+    # 5: Daily pass-rate rollups per product, supplier and parameter, maintained on insert
+    [
+        """
+        CREATE TABLE IF NOT EXISTS compliance_rollups (
+            dimension TEXT NOT NULL,
+            day TEXT NOT NULL,
+            dimension_value TEXT NOT NULL COLLATE NOCASE,
+            total INTEGER NOT NULL,
+            passed INTEGER NOT NULL,
+            PRIMARY KEY (dimension, day, dimension_value)
+        ) WITHOUT ROWID
+        """,
+        lambda cursor: rebuild_rollups(cursor),
+    ],
+    # 6: Recount parameter rollups with WITHIN TOLERANCE rows as passed
+    [
+        lambda cursor: rebuild_rollups(cursor),
+    ],
+    # 7: Re-parse line item values now that "1,500" reads as a thousands separator
+    [
+        "DELETE FROM comparison_items",
+        lambda cursor: backfill_comparison_items(cursor),
+    ],
+    # 8: Re-parse line item values so both sides are stored in the supplier's unit
+    [
+        "DELETE FROM comparison_items",
+        lambda cursor: backfill_comparison_items(cursor),
+    ],
+    # 9: Streamlit stored 'supplier' and 'manufacturer' before both apps shared save_comparisons
+    [
+        "UPDATE documents SET document_type = 'supplier_coa' WHERE document_type = 'supplier'",
+        "UPDATE documents SET document_type = 'manufacturer_results' WHERE document_type = 'manufacturer'",
+    ],
+]
+
+# Add comparisons or line items matching {where} to the daily rollups. The WHERE clause is
+# always present, which SQLite needs to parse an upsert after INSERT ... SELECT. Pass checks
+# use IS so a missing approval status counts as not passed instead of making the sum NULL.
+# Every line item status except NON-COMPLIANT (MATCH, WITHIN TOLERANCE, COMPLIANT) is a pass.
+ROLLUP_UPSERT = """
+    ON CONFLICT (dimension, day, dimension_value)
+    DO UPDATE SET total = total + excluded.total, passed = passed + excluded.passed
+"""
+COMPARISON_ROLLUP_SQL = f"""
+    INSERT INTO compliance_rollups (dimension, day, dimension_value, total, passed)
+    SELECT d.dimension, substr(c.comparison_date, 1, 10),
+           COALESCE(NULLIF(trim(json_extract(c.results_json, d.path)), ''), '{ROLLUP_UNKNOWN}'),
+           COUNT(*),
+           SUM(upper(json_extract(c.results_json, '$.compliance_summary.batch_approval_status')) IS 'APPROVED')
+    FROM comparisons c
+    CROSS JOIN (SELECT 'product' AS dimension, '$.batch_info.product' AS path
+                UNION ALL SELECT 'supplier', '$.batch_info.supplier') d
+    WHERE {{where}}
+    GROUP BY 1, 2, 3
+    {ROLLUP_UPSERT}
+"""
+ITEM_ROLLUP_SQL = f"""
+    INSERT INTO compliance_rollups (dimension, day, dimension_value, total, passed)
+    SELECT 'parameter', substr(comparison_date, 1, 10), parameter,
+           COUNT(*), SUM(status IS NOT 'NON-COMPLIANT')
+    FROM comparison_items
+    WHERE {{where}}
+    GROUP BY 2, 3
+    {ROLLUP_UPSERT}
+"""
+
+# Ids of comparisons whose supplier or manufacturer document has the given batch reference.
+# Written as a UNION of two indexed lookups because SQLite cannot use an index for an
+# OR spanning two joined tables and falls back to scanning every comparison.
+BATCH_MATCHES_SQL = """
+    SELECT c.id FROM documents d
+    JOIN comparisons c ON c.supplier_doc_id = d.id
+    WHERE d.batch_reference = ?
+    UNION
+    SELECT c.id FROM documents d
+    JOIN comparisons c ON c.manufacturer_doc_id = d.id
+    WHERE d.batch_reference = ?
+"""
+
+# One keyset page of comparisons matching a batch reference, newest first, ordered by
+# (comparison_date, id) so pages are stable
+SEARCH_PAGE_SQL = f"""
+    SELECT c.id, c.comparison_date, {{results_column}}
+           s.filename as supplier_filename, m.filename as manufacturer_filename
+    FROM ({BATCH_MATCHES_SQL}) matches
+    JOIN comparisons c ON c.id = matches.id
+    JOIN documents s ON c.supplier_doc_id = s.id
+    JOIN documents m ON c.manufacturer_doc_id = m.id
+    {{keyset_filter}}
+    ORDER BY c.comparison_date DESC, c.id DESC
+    LIMIT ?
+"""
+
+# Documents matching a full-text query, best match first, with their latest comparison
+TEXT_SEARCH_SQL = f"""
+    SELECT d.id, d.filename, d.document_type, d.batch_reference, d.upload_date, f.product,
+           snippet(documents_fts, -1, char(2), char(3), '...', {SNIPPET_TOKENS}) as snippet,
+           (SELECT c.id FROM comparisons c
+            WHERE c.supplier_doc_id = d.id OR c.manufacturer_doc_id = d.id
+            ORDER BY c.comparison_date DESC LIMIT 1) as comparison_id
+    FROM documents_fts f
+    JOIN documents_fts_map fm ON fm.fts_rowid = f.rowid
+    JOIN documents d ON d.id = fm.document_id
+    WHERE documents_fts MATCH ?
+    ORDER BY bm25(documents_fts)
+    LIMIT ?
+"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() returns it to its pool instead of closing it"""
+
+    def close(self):
+        # Closing twice must not put the connection in the pool twice, where two threads could get it
+        if self.released:
+            return
+        self.released = True
+        _release_connection(self)
+
+    def really_close(self):
+        super().close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(database):
+    with _pools_lock:
+        if database not in _pools:
+            _pools[database] = queue.LifoQueue(maxsize=POOL_MAX_IDLE)
+        return _pools[database]
+
+
+def connect(database):
+    """
+    Return a pooled, tuned connection to database. Call close() when done, exactly as with
+    sqlite3.connect(); the connection goes back to the pool for the next caller.
+    """
+    try:
+        conn = _get_pool(database).get_nowait()
+    except queue.Empty:
+        conn = sqlite3.connect(database, timeout=BUSY_TIMEOUT_MS / 1000,
+                               factory=PooledConnection, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.database = database
+    conn.released = False
+    return conn
+
+
+def _release_connection(conn):
+    """Reset a connection and put it back in its pool, closing it if the pool is full"""
+    if conn.in_transaction:
+        conn.rollback()  # Uncommitted work is discarded, as sqlite3 close() would do
+    conn.row_factory = None
+    try:
+        _get_pool(conn.database).put_nowait(conn)
+    except queue.Full:
+        conn.really_close()
+
+
+def begin_write(conn):
+    """
+    Start a write transaction, taking the write lock up front (BEGIN IMMEDIATE) so it can't fail
+    mid-transaction. Retries with jittered backoff if the lock is still held after the busy timeout.
+    """
+    for attempt in range(WRITE_LOCK_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or attempt == WRITE_LOCK_RETRIES:
+                raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+
+
+def insert_comparison(cursor, comparison_id, supplier_doc, supplier_text, manufacturer_doc, manufacturer_text,
+                      batch_number, analysis_result):
+    """
+    Insert both documents of a pair and their comparison; the caller owns the transaction.
+    supplier_doc and manufacturer_doc are dicts with the saved file's 'id', 'filename' and 'path'.
+    """
+    current_time = datetime.now().isoformat()
+    compressed = TEXT_STORAGE == "compressed"
+    
+    # Insert supplier document
+    cursor.execute(
+        "INSERT INTO documents (id, filename, document_type, batch_reference, upload_date, extracted_text, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (supplier_doc['id'], supplier_doc['filename'], 'supplier_coa', batch_number, current_time,
+         None if compressed else supplier_text, supplier_doc['path'])
+    )
+    
+    # Insert manufacturer document
+    cursor.execute(
+        "INSERT INTO documents (id, filename, document_type, batch_reference, upload_date, extracted_text, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (manufacturer_doc['id'], manufacturer_doc['filename'], 'manufacturer_results', batch_number, current_time,
+         None if compressed else manufacturer_text, manufacturer_doc['path'])
+    )
+    
+    if compressed:
+        store_document_text(cursor, supplier_doc['id'], supplier_text)
+        store_document_text(cursor, manufacturer_doc['id'], manufacturer_text)
+    
+    # Store comparison result
+    cursor.execute(
+        "INSERT INTO comparisons (id, supplier_doc_id, manufacturer_doc_id, comparison_date, results_json) VALUES (?, ?, ?, ?, ?)",
+        (comparison_id, supplier_doc['id'], manufacturer_doc['id'], current_time, json.dumps(analysis_result))
+    )
+    insert_comparison_items(cursor, comparison_id, current_time, analysis_result)
+    update_rollups(cursor, comparison_id)
+
+
+def item_values(supplier_result, manufacturer_result):
+    """
+    Parse both results of a line item into (supplier_value, manufacturer_value, unit).
+    Both values are expressed in the one stored unit: the manufacturer value is converted to the
+    supplier's unit, and dropped when the two units measure different things ("%" against "CFU/g").
+    """
+    _, supplier_value, supplier_unit = parse_measurement(supplier_result)
+    _, manufacturer_value, manufacturer_unit = parse_measurement(manufacturer_result)
+    if supplier_value is None:
+        return None, manufacturer_value, manufacturer_unit
+    if manufacturer_value is not None:
+        supplier_dimension, supplier_factor = normalize_unit(supplier_unit)
+        manufacturer_dimension, manufacturer_factor = normalize_unit(manufacturer_unit)
+        if manufacturer_dimension == supplier_dimension:
+            manufacturer_value = manufacturer_value * manufacturer_factor / supplier_factor
+        else:
+            manufacturer_value = None
+    return supplier_value, manufacturer_value, supplier_unit
+
+
+def insert_comparison_items(cursor, comparison_id, comparison_date, analysis_result):
+    """Store each parameter row of an analysis result as a queryable line item"""
+    rows = []
+    for category, key_name in COMPARISON_SECTIONS.items():
+        for item in analysis_result.get(category) or []:
+            parameter = item.get(key_name) or item.get("parameter") or item.get("test")
+            if not parameter:
+                continue
+            supplier_value, manufacturer_value, unit = item_values(item.get("supplier_result"),
+                                                                   item.get("manufacturer_result"))
+            rows.append((
+                comparison_id, comparison_date, category, parameter,
+                item.get("supplier_result"), item.get("manufacturer_result"),
+                supplier_value, manufacturer_value, unit,
+                str(item.get("status", "")).strip().upper()
+            ))
+    cursor.executemany(
+        "INSERT INTO comparison_items (comparison_id, comparison_date, category, parameter, supplier_result, manufacturer_result, supplier_value, manufacturer_value, unit, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def backfill_comparison_items(cursor):
+    """Populate comparison_items for comparisons stored before the table existed"""
+    cursor.execute("""
+        SELECT id, comparison_date, results_json FROM comparisons
+        WHERE id NOT IN (SELECT comparison_id FROM comparison_items)
+    """)
+    for comparison_id, comparison_date, results_json in cursor.fetchall():
+        try:
+            analysis_result = json.loads(results_json)
+        except ValueError:
+            continue
+        insert_comparison_items(cursor, comparison_id, comparison_date, analysis_result)
+
+
+def update_rollups(cursor, comparison_id):
+    """Add one stored comparison and its line items to compliance_rollups"""
+    cursor.execute(COMPARISON_ROLLUP_SQL.format(where="c.id = ?"), (comparison_id,))
+    cursor.execute(ITEM_ROLLUP_SQL.format(where="comparison_id = ?"), (comparison_id,))
+
+
+def rebuild_rollups(cursor):
+    """Recompute compliance_rollups from every stored comparison"""
+    cursor.execute("DELETE FROM compliance_rollups")
+    cursor.execute(COMPARISON_ROLLUP_SQL.format(where="1"))
+    cursor.execute(ITEM_ROLLUP_SQL.format(where="1"))
+
+
+def query_rollups(cursor, dimension, date_from=None, date_to=None):
+    """
+    Return (day, dimension_value, total, passed) rows of one rollup dimension.
+    Dates are ISO strings; date_to is exclusive. Raises ValueError for unknown dimensions.
+    """
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"Invalid dimension: {dimension}")
+    
+    conditions, params = ["dimension = ?"], [dimension]
+    if date_from:
+        conditions.append("day >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("day < ?")
+        params.append(date_to)
+    
+    cursor.execute(f"""
+        SELECT day, dimension_value, total, passed FROM compliance_rollups
+        WHERE {" AND ".join(conditions)}
+        ORDER BY day
+    """, params)
+    return cursor.fetchall()
+
+
+def aggregate_comparison_items(cursor, group_by=("status",), category=None, parameter=None, status=None,
+                               date_from=None, date_to=None):
+    """
+    Count comparison line items grouped by any of ITEM_GROUP_COLUMNS, filtered in SQL.
+    Values are only averaged when every group holds one parameter in one unit, i.e. when grouping
+    by unit and by (or filtering on) parameter; otherwise the averages are NULL.
+    Dates are ISO strings; date_to is exclusive. Raises ValueError for unknown group columns.
+    """
+    unknown = [column for column in group_by if column not in ITEM_GROUP_COLUMNS]
+    if unknown or not group_by:
+        raise ValueError(f"Invalid group_by: {', '.join(unknown) or 'empty'}")
+    
+    conditions, params = [], []
+    for column, value in (("category", category), ("parameter", parameter), ("status", status and status.upper())):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if date_from:
+        conditions.append("comparison_date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("comparison_date < ?")
+        params.append(date_to)
+    
+    group_expressions = [f"{ITEM_GROUP_COLUMNS[column]} as {column}" for column in group_by]
+    if "unit" in group_by and ("parameter" in group_by or parameter):
+        averages = ("AVG(supplier_value)", "AVG(manufacturer_value)", "AVG(manufacturer_value - supplier_value)")
+    else:
+        averages = ("NULL",) * 3
+    sql = f"""
+        SELECT {', '.join(group_expressions)},
+               COUNT(*) as item_count,
+               COUNT(DISTINCT comparison_id) as comparison_count,
+               {averages[0]} as avg_supplier_value,
+               {averages[1]} as avg_manufacturer_value,
+               {averages[2]} as avg_difference
+        FROM comparison_items
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        GROUP BY {', '.join(group_by)}
+        ORDER BY item_count DESC
+    """
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def select_export_comparisons(cursor, date_from=None, date_to=None, status=None, product=None):
+    """
+    Execute the bulk export selection and return the cursor so rows can be streamed.
+    Dates are ISO strings; date_to is exclusive. status matches either the overall compliance
+    or the batch approval status; product matches case-insensitively.
+    """
+    conditions, params = [], []
+    if date_from:
+        conditions.append("comparison_date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("comparison_date < ?")
+        params.append(date_to)
+    if status:
+        conditions.append("""upper(?) IN (json_extract(results_json, '$.compliance_summary.overall_compliance'),
+                                        json_extract(results_json, '$.compliance_summary.batch_approval_status'))""")
+        params.append(status)
+    if product:
+        conditions.append("json_extract(results_json, '$.batch_info.product') = ? COLLATE NOCASE")
+        params.append(product)
+    
+    cursor.execute(f"""
+        SELECT id, comparison_date, results_json FROM comparisons
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY comparison_date, id
+    """, params)
+    return cursor
+
+
+def compress_text(text):
+    """zlib-compress extracted text for storage"""
+    return zlib.compress((text or "").encode("utf-8"), TEXT_COMPRESSION_LEVEL)
+
+
+def decompress_text(content):
+    """Inverse of compress_text"""
+    return zlib.decompress(content).decode("utf-8")
+
+
+def store_document_text(cursor, document_id, text, index=True):
+    """
+    Store a document's extracted text compressed in document_text. The FTS insert trigger only
+    sees documents.extracted_text, so the full-text row is filled in here unless index is False.
+    """
+    text = text or ""
+    cursor.execute(
+        "INSERT OR REPLACE INTO document_text (document_id, codec, original_size, content) VALUES (?, ?, ?, ?)",
+        (document_id, "zlib", len(text.encode("utf-8")), compress_text(text))
+    )
+    if index:
+        cursor.execute(
+            "UPDATE documents_fts SET extracted_text = ? WHERE rowid = (SELECT fts_rowid FROM documents_fts_map WHERE document_id = ?)",
+            (text, document_id)
+        )
+
+
+def get_document_text(cursor, document_id):
+    """Return a document's extracted text, decompressing it only now that a caller needs it"""
+    cursor.execute("SELECT codec, content FROM document_text WHERE document_id = ?", (document_id,))
+    row = cursor.fetchone()
+    if row:
+        return decompress_text(row[1])
+    cursor.execute("SELECT extracted_text FROM documents WHERE id = ?", (document_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def move_text_to_blob_storage(conn, batch_size=500):
+    """
+    Move inline documents.extracted_text into compressed document_text rows, committing every
+    batch_size documents. The full-text index already holds the text, so it is left untouched.
+    Returns the number of documents moved.
+    """
+    cursor = conn.cursor()
+    moved = 0
+    last_rowid = 0
+    while True:
+        cursor.execute(
+            "SELECT rowid, id, extracted_text FROM documents WHERE rowid > ? AND extracted_text IS NOT NULL ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return moved
+        begin_write(conn)
+        for rowid, document_id, text in rows:
+            store_document_text(cursor, document_id, text, index=False)
+            cursor.execute("UPDATE documents SET extracted_text = NULL WHERE id = ?", (document_id,))
+        conn.commit()
+        moved += len(rows)
+        last_rowid = rows[-1][0]
+
+
+def save_comparisons(database, comparisons, chunk_size=None):
+    """
+    Unit of work for comparison persistence. Each item of comparisons holds the arguments of
+    insert_comparison after the cursor. Everything is written in one transaction, so a failure
+    leaves no orphaned documents; bulk imports can pass chunk_size to commit every N comparisons.
+    """
+    comparisons = list(comparisons)
+    chunk_size = chunk_size or max(len(comparisons), 1)
+    conn = connect(database)
+    try:
+        cursor = conn.cursor()
+        for start in range(0, len(comparisons), chunk_size):
+            begin_write(conn)
+            for comparison in comparisons[start:start + chunk_size]:
+                insert_comparison(cursor, *comparison)
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def save_comparison(database, *comparison):
+    """Persist a single document pair and its comparison in one transaction"""
+    save_comparisons(database, [comparison])
+
+
+def apply_migrations(cursor):
+    """Bring the database schema up to date with MIGRATIONS"""
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for statement in statements:
+            # Steps are SQL strings, or callables for data migrations that need Python
+            if callable(statement):
+                statement(cursor)
+            else:
+                cursor.execute(statement)
+        cursor.execute(f"PRAGMA user_version = {number}")
+
+
+def encode_search_cursor(comparison_date, comparison_id):
+    """Encode the position after a search row as an opaque cursor token"""
+    return base64.urlsafe_b64encode(json.dumps([comparison_date, comparison_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_search_cursor(token):
+    """Decode a cursor token into (comparison_date, comparison_id); raises ValueError if malformed"""
+    try:
+        comparison_date, comparison_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid search cursor") from e
+    return comparison_date, comparison_id
+
+
+def search_comparisons_page(cursor, batch_reference, limit=SEARCH_PAGE_SIZE, after=None, summary=False):
+    """
+    Return one page of comparisons matching a batch reference, newest first, and the
+    cursor for the next page (None on the last page). Summary pages omit results_json.
+    """
+    limit = max(1, min(int(limit), MAX_SEARCH_PAGE_SIZE))
+    params = [batch_reference, batch_reference]
+    keyset_filter = ""
+    if after:
+        keyset_filter = "WHERE (c.comparison_date, c.id) < (?, ?)"
+        params.extend(decode_search_cursor(after))
+    params.append(limit + 1)  # One extra row tells us whether another page exists
+
+    sql = SEARCH_PAGE_SQL.format(
+        results_column="" if summary else "c.results_json,",
+        keyset_filter=keyset_filter
+    )
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1][1], rows[-1][0])
+    return rows, next_cursor
+
+
+def build_fts_query(text):
+    """Turn free text into an FTS5 query that requires every term, quoting each to disable query syntax"""
+    terms = text.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def highlight_snippet(snippet):
+    """HTML-escape a search snippet and wrap its matched terms in <mark> tags"""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+
+
+def search_documents_text(cursor, text, limit=TEXT_SEARCH_LIMIT):
+    """Return documents whose text, filename or product matches every term, ranked by relevance"""
+    fts_query = build_fts_query(text)
+    if not fts_query:
+        return []
+    limit = max(1, min(int(limit), MAX_SEARCH_PAGE_SIZE))
+    cursor.execute(TEXT_SEARCH_SQL, (fts_query, limit))
+    return cursor.fetchall()
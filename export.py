@@ -0,0 +1,117 @@
+# export.py
+import os
+import csv
+import io
+import json
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.utils import secure_filename
+from db import connect, select_export_comparisons
+from reports import get_report_artifact
+
+# Bulk export configuration
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(os.cpu_count() or 1)))
+EXPORT_WINDOW = EXPORT_WORKERS * 4  # Reports rendered ahead of the zip writer
+EXPORT_CHUNK_SIZE = 256 * 1024
+MANIFEST_COLUMNS = ["comparison_id", "comparison_date", "batch_reference", "product",
+                    "overall_compliance", "batch_approval_status", "filename"]
+
+_export_pool = None
+_export_pool_lock = threading.Lock()
+
+
+def get_export_pool():
+    """Return the process-wide report rendering pool, creating it on first use"""
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            _export_pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS)
+        return _export_pool
+
+
+def render_export_report(comparison_id, results_json):
+    """Worker: make sure the comparison's PDF is in the report store and return its path"""
+    return get_report_artifact(comparison_id, json.loads(results_json))
+
+
+class ZipStreamBuffer:
+    """Write-only file object that collects zip output until the caller drains it"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_rendered_reports(rows):
+    """
+    Render reports in the export pool, keeping at most EXPORT_WINDOW in flight,
+    and yield (comparison_id, comparison_date, results, pdf_path) in selection order.
+    """
+    pool = get_export_pool()
+    pending = deque()
+    for comparison_id, comparison_date, results_json in rows:
+        pending.append((comparison_id, comparison_date, results_json,
+                        pool.submit(render_export_report, comparison_id, results_json)))
+        if len(pending) >= EXPORT_WINDOW:
+            comparison_id, comparison_date, results_json, future = pending.popleft()
+            yield comparison_id, comparison_date, json.loads(results_json), future.result()
+    while pending:
+        comparison_id, comparison_date, results_json, future = pending.popleft()
+        yield comparison_id, comparison_date, json.loads(results_json), future.result()
+
+
+def stream_report_archive(database, date_from=None, date_to=None, status=None, product=None):
+    """
+    Yield a zip archive of the selected comparison reports piece by piece, plus a manifest.csv.
+    Each PDF is copied from the report store in chunks, so memory use does not grow with the archive.
+    """
+    buffer = ZipStreamBuffer()
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(MANIFEST_COLUMNS)
+
+    conn = connect(database)
+    try:
+        rows = select_export_comparisons(conn.cursor(), date_from, date_to, status, product)
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for comparison_id, comparison_date, results, pdf_path in iter_rendered_reports(rows):
+                batch_info = results.get("batch_info") or {}
+                summary = results.get("compliance_summary") or {}
+                filename = None
+                if pdf_path:
+                    batch_reference = secure_filename(str(batch_info.get("batch_reference") or "")) or "report"
+                    filename = f"CoA_Report_{batch_reference}_{comparison_id[:8]}.pdf"
+                    with open(pdf_path, "rb") as source, archive.open(filename, mode="w") as target:
+                        for chunk in iter(lambda: source.read(EXPORT_CHUNK_SIZE), b""):
+                            target.write(chunk)
+                            yield buffer.drain()
+                    yield buffer.drain()
+                else:
+                    print(f"Error exporting report for comparison {comparison_id}")
+
+                writer.writerow([comparison_id, comparison_date, batch_info.get("batch_reference"),
+                                 batch_info.get("product"), summary.get("overall_compliance"),
+                                 summary.get("batch_approval_status"), filename or ""])
+
+            archive.writestr("manifest.csv", manifest.getvalue())
+        yield buffer.drain()
+    finally:
+        conn.close()
@@ -0,0 +1,40 @@
+# export_reports.py
+"""
+Export rendered compliance reports for a selection of comparisons into a zip archive.
+
+Usage: python export_reports.py OUTPUT_ZIP [--from DATE] [--to DATE] [--status STATUS]
+                                [--product PRODUCT] [--database PATH]
+"""
+import argparse
+import os
+import sys
+from export import stream_report_archive
+
+DATABASE = os.getenv("COA_DATABASE", "coa_database.db")  # Its -wal and -shm files live in the same directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export compliance reports as a zip archive")
+    parser.add_argument("output", help="Path of the zip file to write")
+    parser.add_argument("--from", dest="date_from", help="Earliest comparison date (inclusive, ISO format)")
+    parser.add_argument("--to", dest="date_to", help="Latest comparison date (exclusive, ISO format)")
+    parser.add_argument("--status", help="Overall compliance or batch approval status, e.g. APPROVED")
+    parser.add_argument("--product", help="Product name")
+    parser.add_argument("--database", default=DATABASE, help="SQLite database path")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        print(f"Database not found: {args.database}")
+        sys.exit(1)
+
+    written = 0
+    with open(args.output, "wb") as output:
+        for chunk in stream_report_archive(args.database, args.date_from, args.date_to, args.status, args.product):
+            output.write(chunk)
+            written += len(chunk)
+
+    print(f"Wrote {written:,} bytes to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
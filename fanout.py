@@ -0,0 +1,151 @@
+# fanout.py
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from langchain.schema import HumanMessage, SystemMessage
+from db import COMPARISON_SECTIONS
+from rules import split_sections, summarize_compliance
+from cache import llm_cache_key, get_cached_analysis, store_cached_analysis
+from llm import invoke_llm
+
+# Fan-out configuration: "on", "off", or "auto" to fan out only for long documents
+LLM_FANOUT = os.getenv("LLM_FANOUT", "auto").lower()
+LLM_FANOUT_MIN_CHARS = int(os.getenv("LLM_FANOUT_MIN_CHARS", "12000"))  # Combined text length that triggers auto mode
+LLM_FANOUT_WORKERS = int(os.getenv("LLM_FANOUT_WORKERS", "16"))
+
+SECTION_LABELS = {
+    "physical_characteristics": ("physical characteristics", "MATCH, WITHIN TOLERANCE, NON-COMPLIANT"),
+    "chemical_analysis": ("chemical analysis results", "MATCH, WITHIN TOLERANCE, COMPLIANT, NON-COMPLIANT"),
+    "microbiological_testing": ("microbiological testing results", "MATCH, COMPLIANT, NON-COMPLIANT"),
+}
+
+SECTION_SYSTEM_PROMPT = """
+    You are a pharmaceutical compliance expert. Compare the {label} in a supplier's Certificate of Analysis (CoA)
+    with the same section of a manufacturer's batch test report for the same product.
+
+    Format your response as a JSON object with the following structure:
+    {{
+        "{category}": [
+            {{
+                "{key_name}": "string",
+                "supplier_result": "string",
+                "manufacturer_result": "string",
+                "status": "string ({statuses})"
+            }}
+        ]
+    }}
+
+    Return only the JSON object without any explanations or additional text.
+    """
+
+SUMMARY_SYSTEM_PROMPT = """
+    You are a pharmaceutical compliance expert. From the header and certification sections of a supplier's
+    Certificate of Analysis (CoA) and a manufacturer's batch test report, extract the batch information and
+    create certification information.
+
+    Format your response as a JSON object with the following structure:
+    {
+        "batch_info": {
+            "batch_reference": "string",
+            "supplier_batch": "string",
+            "supplier": "string (supplier company name)",
+            "product": "string",
+            "comparison_date": "string (YYYY-MM-DD)"
+        },
+        "certification": {
+            "certified_by": "string",
+            "reviewed_by": "string",
+            "certification_number": "string",
+            "certification_date": "string (YYYY-MM-DD)"
+        }
+    }
+
+    Return only the JSON object without any explanations or additional text.
+    """
+
+HUMAN_PROMPT = """
+    Supplier Certificate of Analysis Text:
+    {supplier_text}
+
+    Manufacturer Batch Test Report Text:
+    {manufacturer_text}
+
+    Batch Reference: {batch_reference}
+
+    Please analyze these sections and provide the results in the JSON format specified.
+    """
+
+_fanout_executor = ThreadPoolExecutor(max_workers=LLM_FANOUT_WORKERS, thread_name_prefix="llm-fanout")
+
+
+def use_fanout(supplier_text, manufacturer_text):
+    """Whether analysis should be split into per-section requests"""
+    if LLM_FANOUT == "auto":
+        return len(supplier_text or "") + len(manufacturer_text or "") >= LLM_FANOUT_MIN_CHARS
+    return LLM_FANOUT == "on"
+
+
+def run_section_request(database, model_name, system_prompt, supplier_text, manufacturer_text, batch_reference,
+                        required_keys):
+    """Run one sub-request through the LLM cache and return its parsed, validated JSON"""
+    cache_key = llm_cache_key(model_name, system_prompt, supplier_text, manufacturer_text, batch_reference)
+    cached_result = get_cached_analysis(database, cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=HUMAN_PROMPT.format(supplier_text=supplier_text, manufacturer_text=manufacturer_text,
+                                                 batch_reference=batch_reference))
+    ]
+    result = json.loads(invoke_llm(model_name, messages).content)
+    if not all(key in result for key in required_keys):
+        raise ValueError(f"Invalid response format from LLM, expected {', '.join(required_keys)}")
+
+    store_cached_analysis(database, cache_key, model_name, result)
+    return result
+
+
+def analyze_sections(database, model_name, supplier_text, manufacturer_text, batch_reference, categories=None):
+    """
+    Analyze a document pair with one concurrent LLM request per result section plus one for the
+    batch and certification details, each given only its own sections of both documents.
+    categories limits which result sections are sent (e.g. those the rule engine left unresolved).
+    Returns the merged result in the analyze_documents schema, or None when the documents have
+    no recognizable sections. Raises if any sub-request fails.
+    """
+    supplier_sections, manufacturer_sections = split_sections(supplier_text), split_sections(manufacturer_text)
+    if not any(supplier_sections.get(category) for category in COMPARISON_SECTIONS) or \
+            not any(manufacturer_sections.get(category) for category in COMPARISON_SECTIONS):
+        return None
+
+    def section_text(sections, category):
+        return "\n".join(sections.get(category, []))
+
+    futures = {}
+    for category, key_name in COMPARISON_SECTIONS.items():
+        if categories is not None and category not in categories:
+            continue
+        if not supplier_sections.get(category) and not manufacturer_sections.get(category):
+            continue
+        label, statuses = SECTION_LABELS[category]
+        system_prompt = SECTION_SYSTEM_PROMPT.format(label=label, category=category, key_name=key_name,
+                                                     statuses=statuses)
+        futures[category] = _fanout_executor.submit(
+            run_section_request, database, model_name, system_prompt,
+            section_text(supplier_sections, category), section_text(manufacturer_sections, category),
+            batch_reference, [category]
+        )
+    summary_future = _fanout_executor.submit(
+        run_section_request, database, model_name, SUMMARY_SYSTEM_PROMPT,
+        section_text(supplier_sections, None), section_text(manufacturer_sections, None),
+        batch_reference, ["batch_info", "certification"]
+    )
+
+    summary = summary_future.result()
+    result = {"batch_info": summary["batch_info"]}
+    for category in COMPARISON_SECTIONS:
+        result[category] = futures[category].result()[category] if category in futures else []
+    result["compliance_summary"] = summarize_compliance(result)
+    result["certification"] = summary["certification"]
+    return result
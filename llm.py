@@ -0,0 +1,108 @@
+# llm.py
+import os
+import threading
+import time
+import httpx
+from langchain_groq import ChatGroq
+
+# Shared HTTP transport configuration
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_EXPIRY = 120.0  # Seconds an idle connection to the API is kept open
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+LLM_API_BASE = os.getenv("GROQ_API_BASE")  # Overrides the Groq endpoint, e.g. for a local mock server
+
+# Module state is process-wide, so Flask threads and every Streamlit session share one registry
+_http_client = None
+_clients = {}
+_registry_lock = threading.Lock()
+
+_stats = {"calls": 0, "errors": 0, "total_latency": 0.0, "max_latency": 0.0, "requests": 0, "new_connections": 0,
+          "prompts_compacted": 0, "prompt_tokens_before": 0, "prompt_tokens_after": 0}
+_stats_lock = threading.Lock()
+
+
+def _record(**increments):
+    with _stats_lock:
+        for name, value in increments.items():
+            _stats[name] += value
+
+
+def _trace_connection(event_name, info):
+    """httpcore trace callback; a completed TCP connect means the pool could not reuse a connection"""
+    if event_name == "connection.connect_tcp.complete":
+        _record(new_connections=1)
+
+
+def _instrument_request(request):
+    _record(requests=1)
+    request.extensions["trace"] = _trace_connection
+
+
+def get_http_client():
+    """Return the pooled keep-alive HTTP client shared by every LLM client"""
+    global _http_client
+    with _registry_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+                                    keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY),
+                timeout=LLM_REQUEST_TIMEOUT,
+                event_hooks={"request": [_instrument_request]}
+            )
+        return _http_client
+
+
+def get_llm_client(model_name, temperature=0):
+    """Return the chat client for a model configuration, building it on first use"""
+    http_client = get_http_client()
+    key = (model_name, temperature)
+    with _registry_lock:
+        if key not in _clients:
+            options = {"base_url": LLM_API_BASE} if LLM_API_BASE else {}
+            _clients[key] = ChatGroq(temperature=temperature, model_name=model_name,
+                                     http_client=http_client, **options)
+        return _clients[key]
+
+
+def invoke_llm(model_name, messages, temperature=0):
+    """Invoke the shared client for model_name and record the call's latency"""
+    client = get_llm_client(model_name, temperature)
+    start = time.perf_counter()
+    try:
+        return client.invoke(messages)
+    except Exception:
+        _record(errors=1)
+        raise
+    finally:
+        latency = time.perf_counter() - start
+        with _stats_lock:
+            _stats["calls"] += 1
+            _stats["total_latency"] += latency
+            _stats["max_latency"] = max(_stats["max_latency"], latency)
+
+
+def record_prompt_compaction(tokens_before, tokens_after):
+    """Record the estimated prompt size of one analysis request before and after compaction"""
+    _record(prompts_compacted=1, prompt_tokens_before=tokens_before, prompt_tokens_after=tokens_after)
+
+
+def get_llm_stats():
+    """Return call latency, HTTP connection reuse and prompt compaction counters for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    reused = max(stats["requests"] - stats["new_connections"], 0)
+    return {
+        "calls": stats["calls"],
+        "errors": stats["errors"],
+        "avg_latency_ms": stats["total_latency"] / stats["calls"] * 1000 if stats["calls"] else 0.0,
+        "max_latency_ms": stats["max_latency"] * 1000,
+        "http_requests": stats["requests"],
+        "new_connections": stats["new_connections"],
+        "reused_connections": reused,
+        "connection_reuse_ratio": reused / stats["requests"] if stats["requests"] else 0.0,
+        "prompts_compacted": stats["prompts_compacted"],
+        "prompt_tokens_before": stats["prompt_tokens_before"],
+        "prompt_tokens_after": stats["prompt_tokens_after"],
+        "prompt_tokens_saved": stats["prompt_tokens_before"] - stats["prompt_tokens_after"]
+    }
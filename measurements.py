@@ -0,0 +1,70 @@
+# measurements.py
+import re
+
+# A number as written on a CoA. A comma followed by exactly three digits groups thousands
+# ("1,500"); any other comma is a decimal comma ("0,5").
+NUMBER = r'[-+]?(?:[1-9]\d{0,2}(?:,\d{3})+(?![\d,])(?:\.\d+)?|\d+(?:[.,]\d+)?)'
+THOUSANDS_PATTERN = re.compile(r'[-+]?[1-9]\d{0,2}(?:,\d{3})+(?:\.\d+)?')
+
+# A reported result such as "99.5%", "<10 CFU/g", "NMT 0.5 %" or "1.2 mg/kg". A range such
+# as "6.5-7.5" is not a single result, so its tail is never read as the unit.
+MEASUREMENT_PATTERN = re.compile(
+    r'^\s*(?P<qualifier><=|>=|[<>≤≥]|NMT|NLT)?\s*'
+    rf'(?P<value>{NUMBER})\s*'
+    r'(?P<unit>(?!(?:-|–|to\b)\s*[-+]?\d|[.,]\d)[^\d\s].*?)?\s*$',
+    re.IGNORECASE
+)
+
+
+# Result normalization: unit -> (dimension, factor to the dimension's base unit)
+UNIT_FACTORS = {
+    None: ("number", 1.0),
+    "%": ("fraction", 10000.0),
+    "%w/w": ("fraction", 10000.0),
+    "ppm": ("fraction", 1.0),
+    "mg/kg": ("fraction", 1.0),
+    "µg/g": ("fraction", 1.0),
+    "ug/g": ("fraction", 1.0),
+    "ppb": ("fraction", 0.001),
+    "µg/kg": ("fraction", 0.001),
+    "ug/kg": ("fraction", 0.001),
+    "cfu/g": ("cfu/g", 1.0),
+    "cfu/ml": ("cfu/ml", 1.0),
+    "µm": ("length", 1.0),
+    "um": ("length", 1.0),
+    "nm": ("length", 0.001),
+    "mm": ("length", 1000.0),
+    "g/ml": ("density", 1.0),
+    "g/cm3": ("density", 1.0),
+    "g/cm³": ("density", 1.0),
+}
+
+
+def parse_number(text):
+    """Convert a number matched by NUMBER to a float"""
+    text = text.strip()
+    if THOUSANDS_PATTERN.fullmatch(text):
+        return float(text.replace(',', ''))
+    return float(text.replace(',', '.'))
+
+
+def parse_measurement(text):
+    """
+    Split a reported result into (qualifier, numeric value, unit).
+    Returns (None, None, None) for non-numeric results such as "Complies".
+    """
+    match = MEASUREMENT_PATTERN.match(str(text or ""))
+    if not match:
+        return None, None, None
+    qualifier = match.group('qualifier')
+    value = parse_number(match.group('value'))
+    unit = match.group('unit') or None
+    return (qualifier.upper() if qualifier else None), value, unit
+
+
+def normalize_unit(unit):
+    """Map a unit string to (dimension, factor); unknown units only compare with themselves"""
+    if not unit:
+        return UNIT_FACTORS[None]
+    key = unit.strip().lower().replace("μ", "µ").replace(" ", "")
+    return UNIT_FACTORS.get(key, (key, 1.0))
@@ -0,0 +1,70 @@
+# migrate_text_storage.py
+"""
+Move extracted OCR text out of the documents table into compressed storage.
+
+Usage: python migrate_text_storage.py [database_path]
+"""
+import os
+import sys
+import sqlite3
+from db import connect, apply_migrations, move_text_to_blob_storage
+from cache import init_cache_tables
+
+DATABASE = os.getenv("COA_DATABASE", "coa_database.db")  # Its -wal and -shm files live in the same directory
+
+
+def database_size(path):
+    """Size of the database including any WAL file"""
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def main():
+    database = sys.argv[1] if len(sys.argv) > 1 else DATABASE
+    if not os.path.exists(database):
+        print(f"Database not found: {database}")
+        sys.exit(1)
+
+    conn = connect(database)
+    cursor = conn.cursor()
+    init_cache_tables(cursor)
+    apply_migrations(cursor)
+    conn.commit()
+
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(extracted_text)), 0) FROM documents")
+    document_count, inline_text_bytes = cursor.fetchone()
+    size_before = database_size(database)
+
+    moved = move_text_to_blob_storage(conn)
+
+    # Reclaim the space freed in the documents table
+    cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.really_close()
+    vacuum_conn = sqlite3.connect(database)
+    vacuum_conn.execute("VACUUM")
+    vacuum_conn.close()
+
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(SUM(original_size), 0), COALESCE(SUM(LENGTH(content)), 0) FROM document_text")
+    original_bytes, compressed_bytes = cursor.fetchone()
+    # The full-text index keeps an uncompressed copy of the text, which snippets are built from
+    cursor.execute("SELECT COALESCE(SUM(LENGTH(CAST(c2 AS BLOB))), 0) FROM documents_fts_content")
+    index_text_bytes = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(extracted_text)), 0) FROM extraction_cache")
+    cache_entries, cache_bytes = cursor.fetchone()
+    conn.close()
+    size_after = database_size(database)
+
+    print(f"Documents:                {document_count}")
+    print(f"Moved to blob storage:    {moved}")
+    print(f"Inline text before:       {inline_text_bytes:,} bytes")
+    print(f"Stored text (original):   {original_bytes:,} bytes")
+    print(f"Stored text (compressed): {compressed_bytes:,} bytes"
+          + (f" ({compressed_bytes / original_bytes:.1%} of original)" if original_bytes else ""))
+    print(f"Full-text index copy:     {index_text_bytes:,} bytes (uncompressed, used for search snippets)")
+    print(f"Extraction cache:         {cache_bytes:,} bytes in {cache_entries} entries")
+    print(f"Database size:            {size_before:,} -> {size_after:,} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# ocr.py
+import os
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pdf2image import convert_from_path
+from PIL import Image
+import PyPDF2
+import pytesseract
+
+# OCR configuration
+OCR_DPI = 300
+MIN_TEXT_LAYER_CHARS = 25  # Pages whose text layer is shorter than this are treated as scans
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+
+def _init_ocr_worker():
+    """Keep Tesseract single-threaded so page-level parallelism doesn't oversubscribe the CPUs"""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def get_ocr_pool():
+    """Return the process-wide OCR worker pool, creating it on first use"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, initializer=_init_ocr_worker)
+        return _ocr_pool
+
+
+def reset_ocr_pool(pool):
+    """Discard a pool broken by a crashed worker so the next get_ocr_pool call starts a fresh one"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is pool:
+            _ocr_pool = None
+    pool.shutdown(wait=False)
+
+
+def submit_ocr_task(fn, *args):
+    """Submit fn to the OCR pool and return (pool, future), replacing the pool if it is already broken"""
+    pool = get_ocr_pool()
+    try:
+        return pool, pool.submit(fn, *args)
+    except BrokenProcessPool:
+        reset_ocr_pool(pool)
+        pool = get_ocr_pool()
+        return pool, pool.submit(fn, *args)
+
+
+def ocr_task_result(pool, future, fn, *args):
+    """
+    Wait for a task submitted with submit_ocr_task. A worker that dies (e.g. killed for using too
+    much memory) breaks the whole pool and every task queued on it, so the pool is replaced and
+    the task retried once.
+    """
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        reset_ocr_pool(pool)
+        return submit_ocr_task(fn, *args)[1].result()
+
+
+def run_ocr_task(fn, *args):
+    """Run fn in the OCR pool and return its result"""
+    return ocr_task_result(*submit_ocr_task(fn, *args), fn, *args)
+
+
+def read_text_layer(pdf_path):
+    """Return the embedded text of every page of a PDF"""
+    with open(pdf_path, "rb") as file:
+        return [page.extract_text() or "" for page in PyPDF2.PdfReader(file).pages]
+
+
+def ocr_image(image_path):
+    """Run Tesseract on an image file"""
+    return pytesseract.image_to_string(Image.open(image_path))
+
+
+def ocr_pdf_page(pdf_path, page_number):
+    """Rasterize a single 1-based PDF page and run Tesseract on it"""
+    images = convert_from_path(pdf_path, dpi=OCR_DPI, first_page=page_number, last_page=page_number)
+    return "\n".join(pytesseract.image_to_string(image) for image in images)
+
+
+def ocr_pdf_pages(pdf_path, page_numbers):
+    """
+    OCR the given 1-based pages in parallel and return their text in page order.
+    A page that fails yields its exception instead of text, so one bad page does not lose the others.
+    """
+    page_numbers = list(page_numbers)
+    if len(page_numbers) <= 1:
+        tasks = [partial(ocr_pdf_page, pdf_path, page_number) for page_number in page_numbers]
+    else:
+        # Each worker rasterizes its own page so no image data crosses process boundaries
+        tasks = [partial(ocr_task_result, *submit_ocr_task(ocr_pdf_page, pdf_path, page_number),
+                         ocr_pdf_page, pdf_path, page_number)
+                 for page_number in page_numbers]
+
+    results = []
+    for task in tasks:
+        try:
+            results.append(task())
+        except Exception as e:
+            results.append(e)
+    return results
@@ -0,0 +1,183 @@
+# reports.py
+import os
+import hashlib
+import uuid
+from io import BytesIO
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+# Rendered report store configuration
+# Absolute so Flask's send_file resolves it against the filesystem, not the application root
+REPORT_FOLDER = os.path.abspath(os.getenv("REPORT_FOLDER", "rendered_reports"))
+REPORT_TEMPLATE_VERSION = 1  # Bump whenever create_pdf_report output changes so stored PDFs are re-rendered
+
+# Paragraph styles and table templates are built once per process and shared by every report
+STYLES = getSampleStyleSheet()
+TITLE_STYLE = STYLES['Title']
+HEADING_STYLE = STYLES['Heading2']
+
+KEY_VALUE_COL_WIDTHS = [150, 300]
+KEY_VALUE_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.black),
+    ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
+    ('PADDING', (0, 0), (-1, -1), 6)
+])
+
+COMPARISON_COL_WIDTHS = [120, 120, 120, 100]
+COMPARISON_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.black),
+    ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
+    ('PADDING', (0, 0), (-1, -1), 6),
+])
+
+STATUS_TEXT_COLORS = {
+    "MATCH": colors.green,
+    "COMPLIANT": colors.green,
+    "WITHIN TOLERANCE": colors.blue,
+    "REVIEW REQUIRED": colors.orange
+}
+
+
+def build_key_value_table(rows, text_colors=()):
+    """Two-column label/value table; text_colors holds (row, color) pairs for the value column"""
+    table = Table(rows, colWidths=KEY_VALUE_COL_WIDTHS)
+    table.setStyle(KEY_VALUE_TABLE_STYLE)
+    if text_colors:
+        table.setStyle([('TEXTCOLOR', (1, row), (1, row), color) for row, color in text_colors])
+    return table
+
+
+def build_comparison_section(elements, title, data_list, key_name="parameter"):
+    """Append a heading and a supplier/manufacturer comparison table with color-coded status"""
+    elements.append(Paragraph(title, HEADING_STYLE))
+    elements.append(Spacer(1, 6))
+    
+    table_data = [[key_name.capitalize(), "Supplier Result", "Manufacturer Result", "Status"]]
+    for item in data_list:
+        param_key = key_name if key_name in item else "test"
+        table_data.append([item[param_key], item["supplier_result"], item["manufacturer_result"], item["status"]])
+    
+    table = Table(table_data, colWidths=COMPARISON_COL_WIDTHS)
+    table.setStyle(COMPARISON_TABLE_STYLE)
+    table.setStyle([
+        ('TEXTCOLOR', (-1, i), (-1, i), STATUS_TEXT_COLORS.get(row[-1], colors.red))
+        for i, row in enumerate(table_data[1:], start=1)
+    ])
+    elements.append(table)
+    elements.append(Spacer(1, 15))
+
+
+def create_pdf_report(data):
+    """Create PDF report from analysis data"""
+    try:
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter)
+        elements = []
+        
+        # Title
+        elements.append(Paragraph("Certificate of Analysis Compliance Report", TITLE_STYLE))
+        elements.append(Spacer(1, 12))
+        
+        # Batch Info
+        elements.append(Paragraph("Batch Information", HEADING_STYLE))
+        elements.append(build_key_value_table([
+            ["Batch Reference:", data["batch_info"]["batch_reference"]],
+            ["Supplier Batch:", data["batch_info"]["supplier_batch"]],
+            ["Product:", data["batch_info"]["product"]],
+            ["Comparison Date:", data["batch_info"]["comparison_date"]]
+        ]))
+        elements.append(Spacer(1, 20))
+        
+        # Create tables for each section
+        build_comparison_section(elements, "Physical Characteristics", data["physical_characteristics"])
+        build_comparison_section(elements, "Chemical Analysis", data["chemical_analysis"], "test")
+        build_comparison_section(elements, "Microbiological Testing", data["microbiological_testing"])
+        
+        # Compliance Summary, color-coded by overall compliance and approval status
+        elements.append(Paragraph("Compliance Summary", HEADING_STYLE))
+        elements.append(Spacer(1, 6))
+        
+        summary = data["compliance_summary"]
+        elements.append(build_key_value_table([
+            ["Overall Compliance:", summary["overall_compliance"]],
+            ["Variation Tolerance:", summary["variation_tolerance"]],
+            ["Batch Approval Status:", summary["batch_approval_status"]]
+        ], text_colors=[
+            (0, colors.green if summary["overall_compliance"] == "FULLY COMPLIANT" else colors.red),
+            (2, colors.green if summary["batch_approval_status"] == "APPROVED" else colors.red)
+        ]))
+        elements.append(Spacer(1, 20))
+        
+        # Certification
+        elements.append(Paragraph("Certification", HEADING_STYLE))
+        elements.append(Spacer(1, 6))
+        elements.append(build_key_value_table([
+            ["Certified By:", data["certification"]["certified_by"]],
+            ["Reviewed By:", data["certification"]["reviewed_by"]],
+            ["Certification Number:", data["certification"]["certification_number"]],
+            ["Certification Date:", data["certification"]["certification_date"]]
+        ]))
+        
+        # Build PDF
+        doc.build(elements)
+        
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        
+        return pdf_bytes
+    except Exception as e:
+        print(f"Error creating PDF: {e}")
+        return None
+
+
+def report_etag(comparison_id):
+    """ETag for a stored report; comparisons are immutable, so only the template version can change it"""
+    return hashlib.sha256(f"{comparison_id}:{REPORT_TEMPLATE_VERSION}".encode("utf-8")).hexdigest()[:32]
+
+
+def report_artifact_path(comparison_id):
+    """Location of the rendered PDF for a comparison under the current template version"""
+    return os.path.join(REPORT_FOLDER, f"{comparison_id}_v{REPORT_TEMPLATE_VERSION}.pdf")
+
+
+def remove_stale_reports(comparison_id):
+    """Delete PDFs of a comparison that were rendered with an older template version"""
+    for version in range(1, REPORT_TEMPLATE_VERSION):
+        try:
+            os.remove(os.path.join(REPORT_FOLDER, f"{comparison_id}_v{version}.pdf"))
+        except OSError:
+            pass
+
+
+def get_report_artifact(comparison_id, data):
+    """
+    Return the path of the stored PDF for a comparison, rendering it on first request.
+    Returns None if the report could not be rendered.
+    """
+    path = report_artifact_path(comparison_id)
+    if os.path.exists(path):
+        return path
+    
+    pdf_bytes = create_pdf_report(data)
+    if not pdf_bytes:
+        return None
+    
+    # Write to a unique temporary name first so concurrent renders never expose a partial file
+    os.makedirs(REPORT_FOLDER, exist_ok=True)
+    temp_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(temp_path, "wb") as file:
+        file.write(pdf_bytes)
+    os.replace(temp_path, path)
+    remove_stale_reports(comparison_id)
+    return path
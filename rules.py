@@ -0,0 +1,414 @@
+# rules.py
+import os
+import re
+import math
+from datetime import datetime
+from measurements import NUMBER, parse_number, parse_measurement, normalize_unit
+from db import COMPARISON_SECTIONS
+
+# Rule engine configuration
+RULE_ENGINE_ENABLED = os.getenv("RULE_ENGINE_ENABLED", "true").lower() == "true"
+
+# Largest relative difference (percent) between supplier and manufacturer values reported as WITHIN TOLERANCE
+RULE_TOLERANCES = {
+    "physical_characteristics": float(os.getenv("RULE_TOLERANCE_PHYSICAL", "5.0")),
+    "chemical_analysis": float(os.getenv("RULE_TOLERANCE_CHEMICAL", "1.0")),
+    "microbiological_testing": float(os.getenv("RULE_TOLERANCE_MICROBIOLOGICAL", "0.0")),
+}
+
+# Statuses each section may use in the analysis schema, and how others map onto them
+SECTION_STATUS_MAP = {
+    "physical_characteristics": {"COMPLIANT": "WITHIN TOLERANCE"},
+    "chemical_analysis": {},
+    "microbiological_testing": {"WITHIN TOLERANCE": "COMPLIANT"},
+}
+
+SECTION_HEADINGS = [
+    (re.compile(r'^physical characteristics', re.IGNORECASE), "physical_characteristics"),
+    (re.compile(r'^chemical analysis', re.IGNORECASE), "chemical_analysis"),
+    (re.compile(r'^microbiolog', re.IGNORECASE), "microbiological_testing"),
+    (re.compile(r'^(certification|compliance summary)\b', re.IGNORECASE), None),
+]
+MAX_HEADING_LENGTH = 50
+MAX_CELL_LENGTH = 60  # Longer lines are prose, which ends a table
+
+# Table header cells and the column role they identify
+HEADER_ROLES = {
+    "parameter": "name", "test": "name", "test parameter": "name", "attribute": "name",
+    "specification": "spec", "specifications": "spec", "spec": "spec", "limit": "spec", "limits": "spec",
+    "result": "result", "results": "result", "test result": "result", "test results": "result",
+    "method": None, "status": None, "acceptance criteria": None, "unit": None, "units": None,
+}
+CELL_SEPARATOR = re.compile(r'\s*\|\s*|\t+|\s{2,}')
+
+FIELD_PATTERNS = {
+    "batch": re.compile(r'^(?:batch reference|batch number|batch no\.?|lot/batch number|lot number|lot no\.?)\s*:\s*(.+)$',
+                        re.IGNORECASE),
+    "product": re.compile(r'^product(?: name)?\s*:\s*(.+)$', re.IGNORECASE),
+    "reviewed_by": re.compile(r'^reviewed by\s*:\s*(.+)$', re.IGNORECASE),
+}
+
+QUALIFIERS = {"≤": "<=", "NMT": "<=", "≥": ">=", "NLT": ">="}
+BELOW_DETECTION_PATTERN = re.compile(
+    r'^\s*<?\s*(?:lod|loq|nd|bdl|not detected|below (?:the )?(?:limit of )?(?:detection|quantitation))\s*$',
+    re.IGNORECASE
+)
+RANGE_PATTERN = re.compile(rf'^\s*({NUMBER})\s*(?:-|–|to)\s*({NUMBER})\s*(.*?)\s*$', re.IGNORECASE)
+COMPLIES_WORDS = {"complies", "conforms", "pass", "passes", "meets specification", "within specification", "within spec"}
+FAILS_WORDS = {"does not comply", "does not conform", "fail", "fails", "out of specification", "oos"}
+
+
+def normalize_label(text):
+    """Lowercase and strip punctuation so row names and textual results compare reliably"""
+    return re.sub(r'[^a-z0-9%<>.µ/]+', ' ', str(text or "").lower()).strip()
+
+
+def normalize_result(text):
+    """
+    Normalize a reported result into (qualifier, value, dimension).
+    value is in the dimension's base unit; below-detection results have qualifier '<', value None
+    and dimension 'lod'; textual results return (None, None, None).
+    """
+    if BELOW_DETECTION_PATTERN.match(str(text or "")):
+        return "<", None, "lod"
+    qualifier, value, unit = parse_measurement(text)
+    if value is None:
+        return None, None, None
+    dimension, factor = normalize_unit(unit)
+    return QUALIFIERS.get(qualifier, qualifier), value * factor, dimension
+
+
+def parse_specification(text):
+    """Parse a specification into (low, high, dimension); textual or missing specs return None"""
+    match = RANGE_PATTERN.match(str(text or ""))
+    if match:
+        dimension, factor = normalize_unit(match.group(3))
+        low, high = (parse_number(group) * factor for group in match.group(1, 2))
+        return low, high, dimension
+    qualifier, value, dimension = normalize_result(text)
+    if value is None:
+        return None
+    if qualifier in ("<", "<="):
+        return None, value, dimension
+    if qualifier in (">", ">="):
+        return value, None, dimension
+    return None
+
+
+def within_specification(reading, spec):
+    """True/False when a normalized reading can be checked against a parsed spec, otherwise None"""
+    qualifier, value, dimension = reading
+    if spec is None:
+        return None
+    low, high, spec_dimension = spec
+    if dimension == "lod":
+        return True if low is None else None
+    if dimension != spec_dimension:
+        return None
+    if qualifier in ("<", "<="):
+        # An upper-bound reading is only known to pass an upper limit
+        return value <= high if high is not None and low is None else None
+    if qualifier in (">", ">="):
+        return value >= low if low is not None and high is None else None
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+def is_complies_text(text, spec_text):
+    """Whether a textual result states compliance, either in words or by restating the spec"""
+    label = normalize_label(text)
+    return label in COMPLIES_WORDS or (bool(spec_text) and label == normalize_label(spec_text))
+
+
+def compare_results(category, supplier_row, manufacturer_row):
+    """
+    Return the comparison status for one parameter, or None if the rules cannot decide.
+    Both results are checked against the specification before they are compared with each other,
+    so identical out-of-specification results fail; a specification the rules cannot evaluate
+    leaves the row to the LLM.
+    """
+    supplier_text, manufacturer_text = supplier_row["result"], manufacturer_row["result"]
+    spec_text = manufacturer_row.get("spec") or supplier_row.get("spec")
+    identical = normalize_label(supplier_text) == normalize_label(manufacturer_text)
+
+    if any(normalize_label(text) in FAILS_WORDS for text in (supplier_text, manufacturer_text)):
+        return "NON-COMPLIANT"
+
+    supplier, manufacturer = normalize_result(supplier_text), normalize_result(manufacturer_text)
+
+    # Textual results: compliance statements or the spec restated; identical text only matches
+    # when there is no specification it could contradict
+    if supplier[2] is None or manufacturer[2] is None:
+        if supplier[2] is None and manufacturer[2] is None:
+            if is_complies_text(supplier_text, spec_text) and is_complies_text(manufacturer_text, spec_text):
+                return "MATCH"
+            if identical and not spec_text:
+                return "MATCH"
+        return None
+
+    spec = parse_specification(spec_text)
+    supplier_ok, manufacturer_ok = within_specification(supplier, spec), within_specification(manufacturer, spec)
+    if supplier_ok is False or manufacturer_ok is False:
+        return "NON-COMPLIANT"
+    in_specification = bool(supplier_ok and manufacturer_ok)
+    if spec_text and not in_specification:
+        return None
+
+    if "lod" not in (supplier[2], manufacturer[2]) and supplier[2] != manufacturer[2]:
+        return None
+    if identical or supplier[:2] == manufacturer[:2] or (supplier[0] == manufacturer[0] and supplier[1] is not None
+                                                         and manufacturer[1] is not None
+                                                         and math.isclose(supplier[1], manufacturer[1], rel_tol=1e-9)):
+        return "MATCH"
+
+    if supplier[0] is None and manufacturer[0] is None:
+        difference = abs(supplier[1] - manufacturer[1]) / max(abs(supplier[1]), abs(manufacturer[1])) * 100
+        if difference <= RULE_TOLERANCES[category]:
+            return "WITHIN TOLERANCE"
+
+    return "COMPLIANT" if in_specification else None
+
+
+def split_sections(text):
+    """
+    Split extracted text into {category: [lines]} using the section headings.
+    Lines outside the result sections (header fields, summary, certification) are kept under None.
+    """
+    sections, current = {}, None
+    for line in (line.strip() for line in str(text or "").splitlines()):
+        if not line:
+            continue
+        if len(line) <= MAX_HEADING_LENGTH:
+            heading = next((category for pattern, category in SECTION_HEADINGS if pattern.match(line)), False)
+            if heading is not False:
+                current = heading
+                if current is None:
+                    sections.setdefault(None, []).append(line)
+                continue
+        sections.setdefault(current, []).append(line)
+    return sections
+
+
+def header_roles(cells):
+    """Column roles for a header row, or None if the cells are not a results table header"""
+    labels = [normalize_label(cell) for cell in cells]
+    if len(labels) < 2 or not all(label in HEADER_ROLES for label in labels):
+        return None
+    roles = [HEADER_ROLES[label] for label in labels]
+    return roles if "name" in roles and "result" in roles else None
+
+
+def is_table_line(line):
+    """A line of several cells, other than a "Label: value" field"""
+    cells = CELL_SEPARATOR.split(line)
+    return len(cells) >= 2 and ":" not in cells[0]
+
+
+def parse_table(lines):
+    """
+    Parse parameter rows from one section. Handles tables extracted as one row per line
+    (cells separated by tabs, pipes or runs of spaces) and as one cell per line.
+    Returns (rows, consumed), where consumed holds the indices of the header and row lines used.
+    """
+    rows, consumed = [], set()
+    index = 0
+    while index < len(lines):
+        # One row per line
+        roles = header_roles(CELL_SEPARATOR.split(lines[index]))
+        if roles:
+            consumed.add(index)
+            index += 1
+            while index < len(lines):
+                cells = CELL_SEPARATOR.split(lines[index])
+                if len(cells) != len(roles):
+                    break
+                rows.append(dict((role, cell) for role, cell in zip(roles, cells) if role))
+                consumed.add(index)
+                index += 1
+            continue
+
+        # One cell per line: a run of header cells gives the column count
+        end = index
+        while end < len(lines) and normalize_label(lines[end]) in HEADER_ROLES:
+            end += 1
+        roles = header_roles(lines[index:end]) if end - index >= 2 else None
+        if roles:
+            consumed.update(range(index, end))
+            index = end
+            while index + len(roles) <= len(lines):
+                cells = lines[index:index + len(roles)]
+                if any(len(cell) > MAX_CELL_LENGTH for cell in cells):
+                    break
+                rows.append(dict((role, cell) for role, cell in zip(roles, cells) if role))
+                consumed.update(range(index, index + len(roles)))
+                index += len(roles)
+            continue
+        index += 1
+    return rows, consumed
+
+
+def parse_document(text):
+    """
+    Extract header fields, {category: [row]} result tables and the sections holding table rows the
+    rules did not parse from a document's text. A whole table outside the recognized result sections,
+    e.g. under an "Identification" heading before them, is reported as section None.
+    """
+    fields = {}
+    for line in (line.strip() for line in str(text or "").splitlines()):
+        for name, pattern in FIELD_PATTERNS.items():
+            match = pattern.match(line)
+            if match and name not in fields:
+                fields[name] = match.group(1).strip()
+    tables, unaccounted = {}, set()
+    for category, lines in split_sections(text).items():
+        rows, consumed = parse_table(lines)
+        if category in COMPARISON_SECTIONS:
+            tables[category] = rows
+        elif rows:
+            unaccounted.add(category)
+        if any(is_table_line(line) for index, line in enumerate(lines) if index not in consumed):
+            unaccounted.add(category)
+    return fields, tables, unaccounted
+
+
+def has_unsectioned_tables(text):
+    """Whether a document has table rows outside the recognized result sections"""
+    return None in parse_document(text)[2]
+
+
+def first_line(text):
+    """The document's first line when it looks like a company name rather than a field"""
+    for line in str(text or "").splitlines():
+        line = line.strip()
+        if line:
+            return line if ":" not in line and len(line) <= MAX_HEADING_LENGTH else None
+    return None
+
+
+def summarize_compliance(result):
+    """Derive the compliance summary from the per-parameter statuses"""
+    statuses = [item.get("status") for category in COMPARISON_SECTIONS for item in result.get(category) or []]
+    failed = "NON-COMPLIANT" in statuses
+    return {
+        "overall_compliance": "NON-COMPLIANT" if failed else "FULLY COMPLIANT",
+        "variation_tolerance": "Outside Acceptable Limits" if failed else "Within Acceptable Limits",
+        "batch_approval_status": "REJECTED" if failed else "APPROVED"
+    }
+
+
+def compare_documents(supplier_text, manufacturer_text, batch_reference):
+    """
+    Compare the result tables of both documents with deterministic rules.
+    Returns (result, unresolved): result follows the analyze_documents schema and holds only
+    the rows the rules could decide; unresolved lists (category, parameter) pairs left for the LLM,
+    with parameter None for a section whose table could not be fully parsed, and category None
+    when table rows lie outside the recognized result sections.
+    result is None when no result tables were found.
+    """
+    supplier_fields, supplier_tables, supplier_unaccounted = parse_document(supplier_text)
+    manufacturer_fields, manufacturer_tables, manufacturer_unaccounted = parse_document(manufacturer_text)
+    if not any(supplier_tables.values()) or not any(manufacturer_tables.values()):
+        return None, []
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    batch_reference = batch_reference or manufacturer_fields.get("batch", "")
+    result = {
+        "batch_info": {
+            "batch_reference": batch_reference,
+            "supplier_batch": supplier_fields.get("batch", ""),
+            "supplier": first_line(supplier_text) or "",
+            "product": manufacturer_fields.get("product") or supplier_fields.get("product", ""),
+            "comparison_date": today
+        }
+    }
+    unresolved = [(category, None) for category in supplier_unaccounted | manufacturer_unaccounted
+                  if category is None]
+    for category, key_name in COMPARISON_SECTIONS.items():
+        supplier_rows = {normalize_label(row["name"]): row for row in supplier_tables.get(category, [])}
+        manufacturer_rows = {normalize_label(row["name"]): row for row in manufacturer_tables.get(category, [])}
+        if (not supplier_rows and not manufacturer_rows and (category in supplier_tables or category in manufacturer_tables)) \
+                or category in supplier_unaccounted or category in manufacturer_unaccounted:
+            # The section has text or table rows the rules cannot read, so the LLM sees all of it
+            unresolved.append((category, None))
+        items = []
+        for key in list(manufacturer_rows) + [key for key in supplier_rows if key not in manufacturer_rows]:
+            supplier_row, manufacturer_row = supplier_rows.get(key), manufacturer_rows.get(key)
+            status = compare_results(category, supplier_row, manufacturer_row) if supplier_row and manufacturer_row else None
+            if status is None:
+                unresolved.append((category, (manufacturer_row or supplier_row)["name"]))
+                continue
+            items.append({
+                key_name: manufacturer_row["name"],
+                "supplier_result": supplier_row["result"],
+                "manufacturer_result": manufacturer_row["result"],
+                "status": SECTION_STATUS_MAP[category].get(status, status)
+            })
+        result[category] = items
+
+    result["compliance_summary"] = summarize_compliance(result)
+    result["certification"] = {
+        "certified_by": "Automated Rule Engine",
+        "reviewed_by": manufacturer_fields.get("reviewed_by", "Pending Review"),
+        "certification_number": f"CERT-{batch_reference}",
+        "certification_date": today
+    }
+    return result, unresolved
+
+
+def review_rule_result(rule_result, unresolved, supplier_text, manufacturer_text):
+    """
+    Complete a rule result without the LLM: parameters the rules could not decide are listed as
+    REVIEW REQUIRED and the batch is held for review, unless a rule-detected failure rejects it.
+    """
+    _, supplier_tables, _ = parse_document(supplier_text)
+    _, manufacturer_tables, _ = parse_document(manufacturer_text)
+    result = {key: (list(value) if key in COMPARISON_SECTIONS else value) for key, value in rule_result.items()}
+    for category, name in unresolved:
+        if category not in COMPARISON_SECTIONS or name is None:
+            continue
+        key = normalize_label(name)
+        supplier_row = next((row for row in supplier_tables.get(category, []) if normalize_label(row["name"]) == key), {})
+        manufacturer_row = next((row for row in manufacturer_tables.get(category, []) if normalize_label(row["name"]) == key), {})
+        result[category].append({
+            COMPARISON_SECTIONS[category]: name,
+            "supplier_result": supplier_row.get("result", ""),
+            "manufacturer_result": manufacturer_row.get("result", ""),
+            "status": "REVIEW REQUIRED"
+        })
+
+    summary = summarize_compliance(result)
+    if summary["overall_compliance"] != "NON-COMPLIANT":
+        summary = {
+            "overall_compliance": "PARTIALLY COMPLIANT",
+            "variation_tolerance": "Requires Manual Review",
+            "batch_approval_status": "PENDING REVIEW"
+        }
+    result["compliance_summary"] = summary
+    return result
+
+
+def merge_rule_results(llm_result, rule_result):
+    """
+    Overlay the rows the rules decided onto an LLM result. Deterministic statuses win unless the LLM
+    found the row NON-COMPLIANT, and a rule-detected NON-COMPLIANT row always fails the batch.
+    """
+    if not rule_result:
+        return llm_result
+    merged = dict(llm_result)
+    for category, key_name in COMPARISON_SECTIONS.items():
+        rule_rows = {normalize_label(item[key_name]): item for item in rule_result.get(category) or []}
+        items = []
+        for item in llm_result.get(category) or []:
+            key = normalize_label(item.get(key_name) or item.get("parameter") or item.get("test"))
+            rule_item = rule_rows.pop(key, None)
+            # A rule status replaces the LLM's, except that a NON-COMPLIANT finding is never overturned
+            if rule_item is None or (item.get("status") == "NON-COMPLIANT" and rule_item["status"] != "NON-COMPLIANT"):
+                rule_item = item
+            items.append(rule_item)
+        merged[category] = items + list(rule_rows.values())
+    if summarize_compliance(merged)["overall_compliance"] == "NON-COMPLIANT":
+        merged["compliance_summary"] = summarize_compliance(merged)
+    batch_info = dict(merged.get("batch_info") or {})
+    if not batch_info.get("supplier") and rule_result["batch_info"].get("supplier"):
+        batch_info["supplier"] = rule_result["batch_info"]["supplier"]
+    merged["batch_info"] = batch_info
+    return merged
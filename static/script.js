@@ -4,6 +4,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const resultsSection = document.getElementById('results-section');
     const loadingIndicator = document.getElementById('loading-indicator');
     const downloadPdfBtn = document.getElementById('download-pdf');
+    const JOB_POLL_INTERVAL_MS = 2000;
+    let currentComparisonId = null;
     
     // File preview handling
     document.getElementById('supplier-coa').addEventListener('change', function(e) {
@@ -26,8 +28,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Get form data
         const formData = new FormData(uploadForm);
         
-        // Send to backend
-        fetch('/api/analyze', {
+        // Queue the analysis job, then poll until it finishes
+        fetch('/api/analyze?async=true', {
             method: 'POST',
             body: formData
         })
@@ -37,13 +39,15 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             return response.json();
         })
-        .then(data => {
+        .then(job => pollJob(job.status_url))
+        .then(job => {
             // Hide loading indicator
             loadingIndicator.style.display = 'none';
             document.getElementById('results-content').style.display = 'block';
             
             // Populate results
-            populateResults(data);
+            currentComparisonId = job.comparison_id;
+            populateResults(job.result);
         })
         .catch(error => {
             console.error('Error:', error);
@@ -54,10 +58,40 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Download PDF functionality
     downloadPdfBtn.addEventListener('click', function() {
-        generatePDF();
+        // Stored comparisons have a server-rendered report the browser can revalidate by ETag
+        if (currentComparisonId) {
+            window.location.href = `/api/report/${encodeURIComponent(currentComparisonId)}/pdf`;
+        } else {
+            generatePDF();
+        }
     });
     
     // Functions
+    function pollJob(statusUrl) {
+        return new Promise((resolve, reject) => {
+            function check() {
+                fetch(statusUrl)
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error('Network response was not ok');
+                        }
+                        return response.json();
+                    })
+                    .then(job => {
+                        if (job.status === 'completed') {
+                            resolve(job);
+                        } else if (job.status === 'failed') {
+                            reject(new Error(job.error));
+                        } else {
+                            setTimeout(check, JOB_POLL_INTERVAL_MS);
+                        }
+                    })
+                    .catch(reject);
+            }
+            check();
+        });
+    }
+    
     function updateFilePreview(input, previewId) {
         const preview = document.getElementById(previewId);
         if (input.files && input.files[0]) {
@@ -1,22 +1,26 @@
 # app.py
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import json
 import sqlite3
 import uuid
-from datetime import datetime
-import base64
+from datetime import date, timedelta
 from werkzeug.utils import secure_filename
-import PyPDF2
-from pdf2image import convert_from_path
-from PIL import Image
 import io
 import re
-import pytesseract
-from langchain_groq import ChatGroq
-from langchain.schema import HumanMessage, SystemMessage
 import numpy as np
 from dotenv import load_dotenv
+from ocr import run_ocr_task, read_text_layer, ocr_image, ocr_pdf_pages, MIN_TEXT_LAYER_CHARS
+from uploads import save_upload_stream
+from compaction import PAGE_BREAK
+from analysis import analyze_document_pair, generate_fallback_analysis
+from reports import create_pdf_report, get_report_artifact, REPORT_TEMPLATE_VERSION
+from db import (connect, apply_migrations, save_comparison, search_comparisons_page, search_documents_text,
+                highlight_snippet, query_rollups)
+from cache import init_cache_tables, file_sha256, get_cached_text, store_cached_text
 import pandas as pd
 
 # Load environment variables
@@ -28,7 +32,14 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
-DATABASE = 'coa_database.db'
+DATABASE = os.getenv("COA_DATABASE", "coa_database.db")  # Its -wal and -shm files live in the same directory
+LLM_MODEL_NAME = "llama-3.1-8b-instant"
+REPORT_CACHE_ENTRIES = 256  # Rendered PDF reports kept in memory, keyed by comparison id and template version
+VISUALIZATION_CACHE_ENTRIES = 256  # Dashboard figure specs kept in memory, keyed by comparison id
+ROLLUP_CACHE_TTL = 60  # Seconds analytics rollups are reused before re-querying
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "8"))  # Documents extracted at once across sessions
+ANALYTICS_DIMENSIONS = {"Product": "product", "Supplier": "supplier", "Parameter": "parameter"}
+ANALYTICS_PERIODS = {"Day": "D", "Week": "W", "Month": "M"}
 
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -103,7 +114,7 @@ st.markdown("""
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect(DATABASE)
+    conn = connect(DATABASE)
     cursor = conn.cursor()
     
     # Create documents table
@@ -132,6 +143,12 @@ def init_db():
     )
     ''')
     
+    # Create cache tables
+    init_cache_tables(cursor)
+    
+    # Apply schema migrations (indexes)
+    apply_migrations(cursor)
+    
     conn.commit()
     conn.close()
 
@@ -143,217 +160,96 @@ def allowed_file(filename):
 
 # OCR Functions
 def extract_text_from_pdf(pdf_path):
-    """Extract text from a text-based PDF."""
+    """
+    Extract text from a PDF, OCR-ing in parallel only the pages that have no text layer.
+    Returns (text, complete); complete is False when any page could not be read.
+    """
     try:
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page_num in range(len(reader.pages)):
-                text += reader.pages[page_num].extract_text()
-                text += "\n\n"
-        return text
+        # Reading the text layer is quick, so it runs here rather than queueing behind OCR work
+        page_texts = read_text_layer(pdf_path)
+        
+        # Pages with too little text are scans, so only those are rasterized and OCR'd
+        scanned_pages = [page_num + 1 for page_num, page_text in enumerate(page_texts)
+                         if len(page_text.strip()) < MIN_TEXT_LAYER_CHARS]
+        complete = True
+        if scanned_pages:
+            for page_number, ocr_text in zip(scanned_pages, ocr_pdf_pages(pdf_path, scanned_pages)):
+                if isinstance(ocr_text, Exception):
+                    st.warning(f"Error running OCR on page {page_number}, keeping its text layer: {ocr_text}")
+                    complete = False
+                    continue
+                # A blank page can be sent to OCR too, so keep whichever reading has more text
+                if len(ocr_text.strip()) > len(page_texts[page_number - 1].strip()):
+                    page_texts[page_number - 1] = ocr_text
+        
+        return "".join(page_text + "\n\n" + PAGE_BREAK for page_text in page_texts), complete
     except Exception as e:
         st.error(f"Error extracting text from PDF: {e}")
-        return ""
+        return "", False
 
 def extract_text_from_image(image_path):
     """Extract text from image using OCR"""
     try:
-        img = Image.open(image_path)
-        text = pytesseract.image_to_string(img)
-        return text
+        return run_ocr_task(ocr_image, image_path)
     except Exception as e:
         st.error(f"Error extracting text from image: {e}")
         return ""
 
-def extract_text(file_path):
-    """Extract text based on file type"""
+@st.cache_resource
+def get_extraction_executor():
+    """Threads that run document extraction concurrently; the OCR pool does the heavy work"""
+    return ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS, thread_name_prefix="extraction")
+
+def start_extraction(file_path, content_hash):
+    """Begin extracting a saved upload in the background, keeping this session's context for error messages"""
+    ctx = get_script_run_ctx()
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return extract_text(file_path, content_hash)
+    return get_extraction_executor().submit(run)
+
+def extract_text(file_path, content_hash=None):
+    """Extract text based on file type, reusing cached text for previously seen files"""
+    if content_hash is None:
+        content_hash = file_sha256(file_path)
+    cached_text = get_cached_text(DATABASE, content_hash)
+    if cached_text is not None:
+        return cached_text
+    
     if file_path.lower().endswith('.pdf'):
-        return extract_text_from_pdf(file_path)
+        text, complete = extract_text_from_pdf(file_path)
     elif file_path.lower().endswith(('.png', '.jpg', '.jpeg')):
-        return extract_text_from_image(file_path)
+        text, complete = extract_text_from_image(file_path), True
     else:
         return ""
+    
+    # Only cache complete extractions so failed documents and pages are retried on the next upload
+    if text and complete:
+        store_cached_text(DATABASE, content_hash, text)
+    return text
 
 # Analysis Functions
 def analyze_documents(supplier_text, manufacturer_text, batch_reference):
-    """
-    Use LLM to analyze and compare supplier and manufacturer documents
-    """
-    # System prompt for the LLM
-    system_prompt = """
-    You are a pharmaceutical compliance expert. Your task is to analyze and compare a supplier's Certificate of Analysis (CoA) 
-    with a manufacturer's batch test results for the same product. Extract relevant information, identify matching 
-    and non-matching parameters, and determine overall compliance.
-
-    Please follow these steps:
-    1. Extract batch information, product details, and test dates
-    2. Identify and compare physical characteristics from both documents
-    3. Identify and compare chemical analysis results from both documents
-    4. Identify and compare microbiological testing results from both documents
-    5. Determine overall compliance status based on the comparisons
-    6. Create certification information
-
-    Format your response as a JSON object with the following structure:
-    {
-        "batch_info": {
-            "batch_reference": "string",
-            "supplier_batch": "string",
-            "product": "string",
-            "comparison_date": "string (YYYY-MM-DD)"
-        },
-        "physical_characteristics": [
-            {
-                "parameter": "string",
-                "supplier_result": "string",
-                "manufacturer_result": "string",
-                "status": "string (MATCH, WITHIN TOLERANCE, NON-COMPLIANT)"
-            }
-        ],
-        "chemical_analysis": [
-            {
-                "test": "string",
-                "supplier_result": "string",
-                "manufacturer_result": "string",
-                "status": "string (MATCH, WITHIN TOLERANCE, COMPLIANT, NON-COMPLIANT)"
-            }
-        ],
-        "microbiological_testing": [
-            {
-                "parameter": "string",
-                "supplier_result": "string",
-                "manufacturer_result": "string",
-                "status": "string (MATCH, COMPLIANT, NON-COMPLIANT)"
-            }
-        ],
-        "compliance_summary": {
-            "overall_compliance": "string (FULLY COMPLIANT, PARTIALLY COMPLIANT, NON-COMPLIANT)",
-            "variation_tolerance": "string",
-            "batch_approval_status": "string (APPROVED, REJECTED)"
-        },
-        "certification": {
-            "certified_by": "string",
-            "reviewed_by": "string",
-            "certification_number": "string",
-            "certification_date": "string (YYYY-MM-DD)"
-        }
-    }
-
-    Return only the JSON object without any explanations or additional text.
-    """
-
-    # Prepare human message with the document texts
-    human_message = f"""
-    Supplier Certificate of Analysis Text:
-    {supplier_text}
-
-    Manufacturer Batch Test Report Text:
-    {manufacturer_text}
-
-    Batch Reference: {batch_reference}
-
-    Please analyze these documents and provide the comparison results in the JSON format specified.
-    """
-
-    # Using LangChain with Groq model
+    """Compare a supplier and manufacturer document, falling back to a default analysis if the LLM fails"""
     try:
-        with st.spinner("Analyzing documents... This might take a moment."):
-            chat = ChatGroq(temperature=0, model_name="llama-3.1-8b-instant")
-            
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=human_message)
-            ]
-            
-            response = chat.invoke(messages)
-            result = json.loads(response.content)
-            
-            # Validate JSON structure (simple check)
-            required_keys = ['batch_info', 'physical_characteristics', 'chemical_analysis', 
-                            'microbiological_testing', 'compliance_summary', 'certification']
-            
-            if not all(key in result for key in required_keys):
-                raise ValueError("Invalid response format from LLM")
-                
-            return result
+        return analyze_document_pair(DATABASE, LLM_MODEL_NAME, supplier_text, manufacturer_text, batch_reference,
+                                     warn=st.warning)
     except Exception as e:
         st.error(f"Error in LLM analysis: {e}")
-        # Return fallback/default analysis in case of error
         return generate_fallback_analysis(batch_reference)
 
-def generate_fallback_analysis(batch_reference):
-    """Generate fallback analysis in case of LLM failure"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    return {
-        "batch_info": {
-            "batch_reference": batch_reference,
-            "supplier_batch": f"S-{batch_reference}",
-            "product": "Pharmaceutical Product",
-            "comparison_date": today
-        },
-        "physical_characteristics": [
-            {
-                "parameter": "Appearance",
-                "supplier_result": "Complies",
-                "manufacturer_result": "Complies",
-                "status": "MATCH"
-            },
-            {
-                "parameter": "Particle Size",
-                "supplier_result": "Within spec",
-                "manufacturer_result": "Within spec",
-                "status": "MATCH"
-            }
-        ],
-        "chemical_analysis": [
-            {
-                "test": "Purity",
-                "supplier_result": "99.5%",
-                "manufacturer_result": "99.4%",
-                "status": "WITHIN TOLERANCE"
-            }
-        ],
-        "microbiological_testing": [
-            {
-                "parameter": "Total Aerobic Count",
-                "supplier_result": "<10 CFU/g",
-                "manufacturer_result": "<10 CFU/g",
-                "status": "MATCH"
-            }
-        ],
-        "compliance_summary": {
-            "overall_compliance": "FULLY COMPLIANT",
-            "variation_tolerance": "Within Acceptable Limits",
-            "batch_approval_status": "APPROVED"
-        },
-        "certification": {
-            "certified_by": "Automated System",
-            "reviewed_by": "QA Officer",
-            "certification_number": f"CERT-{batch_reference}",
-            "certification_date": today
-        }
-    }
-
-def search_reports(batch_reference):
-    """Search for historical reports based on batch reference"""
+def search_reports(batch_reference, after=None):
+    """Search for one page of historical reports based on batch reference"""
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = connect(DATABASE)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # Query for comparisons with the given batch reference
-        cursor.execute("""
-            SELECT c.id, c.comparison_date, c.results_json, 
-                   s.filename as supplier_filename, m.filename as manufacturer_filename
-            FROM comparisons c
-            JOIN documents s ON c.supplier_doc_id = s.id
-            JOIN documents m ON c.manufacturer_doc_id = m.id
-            WHERE s.batch_reference = ? OR m.batch_reference = ?
-            ORDER BY c.comparison_date DESC
-        """, (batch_reference, batch_reference))
+        # Query for one page of comparisons with the given batch reference
+        rows, next_cursor = search_comparisons_page(cursor, batch_reference, after=after)
         
         results = []
-        for row in cursor.fetchall():
+        for row in rows:
             results.append({
                 'id': row['id'],
                 'date': row['comparison_date'],
@@ -363,16 +259,55 @@ def search_reports(batch_reference):
             })
         
         conn.close()
-        return results
+        return results, next_cursor
     
     except Exception as e:
         st.error(f"Error searching reports: {e}")
+        return [], None
+
+def search_document_text(query):
+    """Full-text search over extracted document text, filenames and product names"""
+    try:
+        conn = connect(DATABASE)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        results = []
+        for row in search_documents_text(cursor, query):
+            results.append({
+                'filename': row['filename'],
+                'document_type': row['document_type'],
+                'batch_reference': row['batch_reference'],
+                'upload_date': row['upload_date'],
+                'product': row['product'],
+                'snippet': highlight_snippet(row['snippet'])
+            })
+        
+        conn.close()
+        return results
+    
+    except Exception as e:
+        st.error(f"Error searching document text: {e}")
         return []
 
+@st.cache_data(ttl=ROLLUP_CACHE_TTL, show_spinner=False)
+def load_rollups(dimension, date_from, date_to):
+    """Load the daily compliance rollups of one dimension as a DataFrame"""
+    try:
+        conn = connect(DATABASE)
+        cursor = conn.cursor()
+        rows = query_rollups(cursor, dimension, date_from, date_to)
+        conn.close()
+        return pd.DataFrame(rows, columns=["day", "value", "total", "passed"])
+    
+    except Exception as e:
+        st.error(f"Error loading analytics: {e}")
+        return pd.DataFrame(columns=["day", "value", "total", "passed"])
+
 def get_report(report_id):
     """Get specific report by ID"""
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = connect(DATABASE)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -390,180 +325,18 @@ def get_report(report_id):
         st.error(f"Error retrieving report: {e}")
         return None
 
-def create_pdf_report(data):
-    """Create PDF report from analysis data"""
-    try:
-        import matplotlib.pyplot as plt
-        from reportlab.lib.pagesizes import letter
-        from reportlab.pdfgen import canvas
-        from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from io import BytesIO
-        
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = styles['Title']
-        heading_style = styles['Heading2']
-        normal_style = styles['Normal']
-        
-        # Title
-        elements.append(Paragraph("Certificate of Analysis Compliance Report", title_style))
-        elements.append(Spacer(1, 12))
-        
-        # Batch Info
-        elements.append(Paragraph("Batch Information", heading_style))
-        batch_data = [
-            ["Batch Reference:", data["batch_info"]["batch_reference"]],
-            ["Supplier Batch:", data["batch_info"]["supplier_batch"]],
-            ["Product:", data["batch_info"]["product"]],
-            ["Comparison Date:", data["batch_info"]["comparison_date"]]
-        ]
-        batch_table = Table(batch_data, colWidths=[150, 300])
-        batch_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.black),
-            ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
-            ('PADDING', (0, 0), (-1, -1), 6)
-        ]))
-        elements.append(batch_table)
-        elements.append(Spacer(1, 20))
-        
-        # Function to create comparison tables
-        def create_comparison_table(title, data_list, key_name="parameter"):
-            elements.append(Paragraph(title, heading_style))
-            elements.append(Spacer(1, 6))
-            
-            table_data = [[key_name.capitalize(), "Supplier Result", "Manufacturer Result", "Status"]]
-            for item in data_list:
-                param_key = key_name if key_name in item else "test"
-                row = [
-                    item[param_key], 
-                    item["supplier_result"], 
-                    item["manufacturer_result"],
-                    item["status"]
-                ]
-                table_data.append(row)
-            
-            table = Table(table_data, colWidths=[120, 120, 120, 100])
-            
-            # Define the table style
-            style = [
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.black),
-                ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
-                ('PADDING', (0, 0), (-1, -1), 6),
-            ]
-            
-            # Add color coding for status
-            for i in range(1, len(table_data)):
-                status = table_data[i][-1]
-                if status == "MATCH" or status == "COMPLIANT":
-                    style.append(('TEXTCOLOR', (-1, i), (-1, i), colors.green))
-                elif status == "WITHIN TOLERANCE":
-                    style.append(('TEXTCOLOR', (-1, i), (-1, i), colors.blue))
-                else:
-                    style.append(('TEXTCOLOR', (-1, i), (-1, i), colors.red))
-            
-            table.setStyle(TableStyle(style))
-            elements.append(table)
-            elements.append(Spacer(1, 15))
-        
-        # Create tables for each section
-        create_comparison_table("Physical Characteristics", data["physical_characteristics"])
-        create_comparison_table("Chemical Analysis", data["chemical_analysis"], "test")
-        create_comparison_table("Microbiological Testing", data["microbiological_testing"])
-        
-        # Compliance Summary
-        elements.append(Paragraph("Compliance Summary", heading_style))
-        elements.append(Spacer(1, 6))
-        
-        compliance_data = [
-            ["Overall Compliance:", data["compliance_summary"]["overall_compliance"]],
-            ["Variation Tolerance:", data["compliance_summary"]["variation_tolerance"]],
-            ["Batch Approval Status:", data["compliance_summary"]["batch_approval_status"]]
-        ]
-        
-        compliance_table = Table(compliance_data, colWidths=[150, 300])
-        compliance_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.black),
-            ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
-            ('PADDING', (0, 0), (-1, -1), 6)
-        ]))
-        
-        # Color-code compliance status
-        overall_status = data["compliance_summary"]["overall_compliance"]
-        approval_status = data["compliance_summary"]["batch_approval_status"] 
-        
-        if overall_status == "FULLY COMPLIANT":
-            compliance_table.setStyle(TableStyle([('TEXTCOLOR', (1, 0), (1, 0), colors.green)]))
-        else:
-            compliance_table.setStyle(TableStyle([('TEXTCOLOR', (1, 0), (1, 0), colors.red)]))
-            
-        if approval_status == "APPROVED":
-            compliance_table.setStyle(TableStyle([('TEXTCOLOR', (1, 2), (1, 2), colors.green)]))
-        else:
-            compliance_table.setStyle(TableStyle([('TEXTCOLOR', (1, 2), (1, 2), colors.red)]))
-        
-        elements.append(compliance_table)
-        elements.append(Spacer(1, 20))
-        
-        # Certification
-        elements.append(Paragraph("Certification", heading_style))
-        elements.append(Spacer(1, 6))
-        
-        cert_data = [
-            ["Certified By:", data["certification"]["certified_by"]],
-            ["Reviewed By:", data["certification"]["reviewed_by"]],
-            ["Certification Number:", data["certification"]["certification_number"]],
-            ["Certification Date:", data["certification"]["certification_date"]]
-        ]
-        
-        cert_table = Table(cert_data, colWidths=[150, 300])
-        cert_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('INNERGRID', (0, 0), (-1, -1), 0.25, colors.black),
-            ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
-            ('PADDING', (0, 0), (-1, -1), 6)
-        ]))
-        elements.append(cert_table)
-        
-        # Build PDF
-        doc.build(elements)
-        
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
-        
-        return pdf_bytes
-    except Exception as e:
-        st.error(f"Error creating PDF: {e}")
+@st.cache_data(max_entries=REPORT_CACHE_ENTRIES, show_spinner=False)
+def get_report_pdf(comparison_id, template_version, _data):
+    """
+    Load the PDF report for a stored comparison from the shared report store, rendering it once if needed.
+    Stored comparisons never change, so the id and template version are the cache key; _data is not hashed.
+    """
+    path = get_report_artifact(comparison_id, _data)
+    if not path:
+        st.error("Error creating PDF report")
         return None
-
-def get_download_link(pdf_bytes, filename="report.pdf"):
-    """Generate a download link for the PDF"""
-    b64 = base64.b64encode(pdf_bytes).decode()
-    href = f'<a href="data:application/pdf;base64,{b64}" download="{filename}" class="download-button">Download PDF Report</a>'
-    return href
+    with open(path, "rb") as file:
+        return file.read()
 
 # UI Components
 def get_status_color(status):
@@ -681,7 +454,7 @@ def main():
     st.sidebar.title("Navigation")
     
     page = st.sidebar.radio("Select a page:", 
-                           ["Documents", "Search Reports", "About"])
+                           ["Documents", "Search Reports", "Analytics", "About"])
     
     st.sidebar.markdown("---")
     st.sidebar.info("This tool analyzes and compares Certificates of Analysis (CoA) with manufacturer batch results to verify compliance.")
@@ -690,6 +463,8 @@ def main():
         render_upload_and_results_page()
     elif page == "Search Reports":
         render_search_page()
+    elif page == "Analytics":
+        render_analytics_page()
     else:
         render_about_page()
     
@@ -750,60 +525,37 @@ def render_upload_content():
             supplier_path = os.path.join(UPLOAD_FOLDER, f"{supplier_id}_{supplier_filename}")
             manufacturer_path = os.path.join(UPLOAD_FOLDER, f"{manufacturer_id}_{manufacturer_filename}")
 
-            # Save files
-            with open(supplier_path, "wb") as f:
-                f.write(supplier_file.getbuffer())
+            # Save files in blocks, hashing them for the extraction cache on the way.
+            # Each extraction starts as soon as its file is saved, so OCR of the supplier
+            # document overlaps saving the manufacturer upload and both documents run concurrently.
+            supplier_file.seek(0)
+            supplier_hash, _ = save_upload_stream(supplier_file, supplier_path)
+            supplier_extraction = start_extraction(supplier_path, supplier_hash)
                 
-            with open(manufacturer_path, "wb") as f:
-                f.write(manufacturer_file.getbuffer())
+            manufacturer_file.seek(0)
+            manufacturer_hash, _ = save_upload_stream(manufacturer_file, manufacturer_path)
+            manufacturer_extraction = start_extraction(manufacturer_path, manufacturer_hash)
 
             # Extract text from files
             with st.spinner("Extracting text from documents..."):
-                supplier_text = extract_text(supplier_path)
-                manufacturer_text = extract_text(manufacturer_path)
+                supplier_text = supplier_extraction.result()
+                manufacturer_text = manufacturer_extraction.result()
                 
                 if not supplier_text or not manufacturer_text:
                     st.error("Could not extract text from one or both documents. Please check the files and try again.")
                     return
-                
-                # Save documents to database
-                now = datetime.now().isoformat()
-                conn = sqlite3.connect(DATABASE)
-                cursor = conn.cursor()
-                
-                # Insert supplier document
-                cursor.execute(
-                    "INSERT INTO documents (id, filename, document_type, batch_reference, upload_date, extracted_text, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (supplier_id, supplier_filename, "supplier", batch_number, now, supplier_text, supplier_path)
-                )
-                
-                # Insert manufacturer document
-                cursor.execute(
-                    "INSERT INTO documents (id, filename, document_type, batch_reference, upload_date, extracted_text, file_path) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (manufacturer_id, manufacturer_filename, "manufacturer", batch_number, now, manufacturer_text, manufacturer_path)
-                )
-                
-                conn.commit()
-                conn.close()
 
             # Analyze documents
             with st.spinner("Analyzing and comparing documents..."):
                 analysis_results = analyze_documents(supplier_text, manufacturer_text, batch_number)
                 
-                # Save comparison results
+                # Save documents and comparison results in a single transaction
                 comparison_id = str(uuid.uuid4())
-                now = datetime.now().isoformat()
-                
-                conn = sqlite3.connect(DATABASE)
-                cursor = conn.cursor()
-                
-                cursor.execute(
-                    "INSERT INTO comparisons (id, supplier_doc_id, manufacturer_doc_id, comparison_date, results_json) VALUES (?, ?, ?, ?, ?)",
-                    (comparison_id, supplier_id, manufacturer_id, now, json.dumps(analysis_results))
-                )
+                supplier_doc = {'id': supplier_id, 'filename': supplier_filename, 'path': supplier_path}
+                manufacturer_doc = {'id': manufacturer_id, 'filename': manufacturer_filename, 'path': manufacturer_path}
                 
-                conn.commit()
-                conn.close()
+                save_comparison(DATABASE, comparison_id, supplier_doc, supplier_text, manufacturer_doc, manufacturer_text,
+                                batch_number, analysis_results)
                 
                 # Set session state to view results
                 st.session_state['current_results'] = analysis_results
@@ -904,6 +656,10 @@ def create_visualizations(results):
         }
     }
     
+    # Matching parameters across all sections
+    match_count = total_compliant
+    total_params = sum(len(results[section]) for section in ["physical_characteristics", "chemical_analysis", "microbiological_testing"])
+    
     # 3. Gauge chart for compliance score
     compliance_percentage = (total_compliant / (total_compliant + total_non_compliant)) * 100 if (total_compliant + total_non_compliant) > 0 else 0
     
@@ -936,18 +692,50 @@ def create_visualizations(results):
         }
     }
     
+    # 4. Issues by category, when the analysis reports any
+    fig_issues = None
+    if results.get("issue_categories"):
+        fig_issues = {
+            "data": [
+                {
+                    "type": "bar",
+                    "x": list(results["issue_categories"].values()),
+                    "y": list(results["issue_categories"].keys()),
+                    "orientation": "h",
+                    "marker": {"color": "#fd7e14"}
+                }
+            ],
+            "layout": {
+                "title": "Issues by Category",
+                "height": 250,
+                "margin": {"t": 40, "b": 30, "l": 150, "r": 30},
+                "xaxis": {"title": "Count"}
+            }
+        }
+    
     return {
         "category_chart": fig_category,
         "overall_chart": fig_overall,
-        "gauge_chart": fig_gauge
+        "gauge_chart": fig_gauge,
+        "issues_chart": fig_issues,
+        "match_count": match_count,
+        "total_params": total_params
     }
 
+@st.cache_data(max_entries=VISUALIZATION_CACHE_ENTRIES, show_spinner=False)
+def get_visualizations(comparison_id, _results):
+    """
+    Build the dashboard figures for a stored comparison once and reuse them on later reruns.
+    Stored comparisons never change, so the id alone is the cache key; _results is not hashed.
+    """
+    return create_visualizations(_results)
+
 def render_results_content():
     """Render the results content with enhanced visualizations"""
     results = st.session_state['current_results']
     
     # Generate visualizations
-    visualizations = create_visualizations(results)
+    visualizations = get_visualizations(st.session_state.get('current_comparison_id'), results)
 
     # Create tabs for different views
     tabs = st.tabs(["Dashboard", "Detailed Report", "Raw Data"])
@@ -971,15 +759,8 @@ def render_results_content():
         
         with col2:
             # Count matching parameters
-            match_count = 0
-            total_params = 0
-            
-            for section in ["physical_characteristics", "chemical_analysis", "microbiological_testing"]:
-                for item in results[section]:
-                    total_params += 1
-                    if item["status"] in ["MATCH", "COMPLIANT"]:
-                        match_count += 1
-            
+            match_count = visualizations["match_count"]
+            total_params = visualizations["total_params"]
             match_percentage = round(match_count / total_params * 100 if total_params > 0 else 0)
             st.metric("Matching Parameters", f"{match_count}/{total_params}", f"{match_percentage}%")
         
@@ -1003,39 +784,17 @@ def render_results_content():
         st.plotly_chart(visualizations["category_chart"], use_container_width=True)
         
         # Issue categories visualization
-        if "issue_categories" in results and results["issue_categories"]:
+        if visualizations["issues_chart"]:
             st.markdown('<h3 class="section-header">Issue Categories</h3>', unsafe_allow_html=True)
-            
-            # Prepare issues data
-            issue_types = list(results["issue_categories"].keys())
-            issue_counts = list(results["issue_categories"].values())
-            
-            # Create horizontal bar chart for issues
-            issues_chart = {
-                "data": [
-                    {
-                        "type": "bar",
-                        "x": issue_counts,
-                        "y": issue_types,
-                        "orientation": "h",
-                        "marker": {"color": "#fd7e14"}
-                    }
-                ],
-                "layout": {
-                    "title": "Issues by Category",
-                    "height": 250,
-                    "margin": {"t": 40, "b": 30, "l": 150, "r": 30},
-                    "xaxis": {"title": "Count"}
-                }
-            }
-            
-            st.plotly_chart(issues_chart, use_container_width=True)
+            st.plotly_chart(visualizations["issues_chart"], use_container_width=True)
         
         # Download report button
-        pdf_bytes = create_pdf_report(results)
-        print(pdf_bytes)
+        pdf_bytes = get_report_pdf(st.session_state.get('current_comparison_id'), REPORT_TEMPLATE_VERSION, results)
         if pdf_bytes:
-            st.markdown(get_download_link(pdf_bytes, f"CoA_Report_{results['batch_info']['batch_reference']}.pdf"), unsafe_allow_html=True)
+            st.download_button("Download PDF Report", pdf_bytes,
+                               file_name=f"CoA_Report_{results['batch_info']['batch_reference']}.pdf",
+                               mime="application/pdf",
+                               key="results_pdf_download")
         
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -1069,37 +828,88 @@ def render_search_page():
     """Render the search page with proper state management"""
     st.markdown('<h2 class="section-header">Search Historical Reports</h2>', unsafe_allow_html=True)
 
+    search_mode = st.radio("Search by", ["Batch Reference", "Document Text"], horizontal=True, key="search_mode")
+    if search_mode == "Document Text":
+        render_text_search()
+        return
+
     # Otherwise, show the search interface
     search_batch = st.text_input("Enter Batch Reference Number", key="search_batch")
     search_button = st.button("Search", type="primary", key="search_button")
 
+    # Keep loaded pages in session state so "Load more" can append the next page
     if search_button and search_batch:
         with st.spinner(f"Searching for reports matching batch '{search_batch}'..."):
-            results = search_reports(search_batch)
+            results, next_cursor = search_reports(search_batch)
+            st.session_state['search_query'] = search_batch
+            st.session_state['search_results'] = results
+            st.session_state['search_next_cursor'] = next_cursor
+    
+    if st.session_state.get('search_query'):
+        search_batch = st.session_state['search_query']
+        results = st.session_state['search_results']
+        next_cursor = st.session_state['search_next_cursor']
+        
+        if results:
+            more = "+" if next_cursor else ""
+            st.success(f"Found {len(results)}{more} reports matching batch reference '{search_batch}'")
             
-            if results:
-                st.success(f"Found {len(results)} reports matching batch reference '{search_batch}'")
-                
-                # Display results in a table with view buttons
-                for i, result in enumerate(results):
-                    with st.container():
-                        st.markdown("---")
-                        col1, col2 = st.columns([3, 1])
+            # Display results in a table with view buttons
+            for i, result in enumerate(results):
+                with st.container():
+                    st.markdown("---")
+                    col1, col2 = st.columns([3, 1])
+                    
+                    with col1:
+                        st.markdown(f"**Report {i+1}**")
+                        st.markdown(f"**Supplier Document:** {result['supplier_file']}")
+                        st.markdown(f"**Manufacturer Document:** {result['manufacturer_file']}")
+                        st.markdown(f"**Date:** {result['date']}")
                         
-                        with col1:
-                            st.markdown(f"**Report {i+1}**")
-                            st.markdown(f"**Supplier Document:** {result['supplier_file']}")
-                            st.markdown(f"**Manufacturer Document:** {result['manufacturer_file']}")
-                            st.markdown(f"**Date:** {result['date']}")
-                            print(result)
-                            pdf_bytes = create_pdf_report(result['results'])
+                        # Render the PDF only once someone asks for it
+                        if st.session_state.get(f"pdf_requested_{result['id']}"):
+                            pdf_bytes = get_report_pdf(result['id'], REPORT_TEMPLATE_VERSION, result['results'])
                             if pdf_bytes:
-                                st.markdown(get_download_link(pdf_bytes, f"CoA_Report_{result['results']['batch_info']['batch_reference']}.pdf"), unsafe_allow_html=True)
-                            
-                            st.markdown('</div>', unsafe_allow_html=True)
-                                                
+                                st.download_button("Download PDF Report", pdf_bytes,
+                                                   file_name=f"CoA_Report_{result['results']['batch_info']['batch_reference']}.pdf",
+                                                   mime="application/pdf",
+                                                   key=f"pdf_download_{result['id']}")
+                        elif st.button("Generate PDF Report", key=f"pdf_generate_{result['id']}"):
+                            st.session_state[f"pdf_requested_{result['id']}"] = True
+                            st.rerun()
+                        
+                        st.markdown('</div>', unsafe_allow_html=True)
+            
+            if next_cursor and st.button("Load more", key="search_load_more"):
+                more_results, more_cursor = search_reports(search_batch, after=next_cursor)
+                st.session_state['search_results'] = results + more_results
+                st.session_state['search_next_cursor'] = more_cursor
+                st.rerun()
+                                            
+        else:
+            st.warning(f"No reports found matching batch reference '{search_batch}'")
+
+def render_text_search():
+    """Render full-text search over archived document text"""
+    search_text = st.text_input("Search document text, filenames and products",
+                                key="search_text",
+                                help="Every word must appear, e.g. an impurity name or a supplier lot number")
+    search_button = st.button("Search", type="primary", key="search_text_button")
+
+    if search_button and search_text.strip():
+        with st.spinner(f"Searching documents for '{search_text}'..."):
+            results = search_document_text(search_text)
+            
+            if results:
+                st.success(f"Found {len(results)} documents matching '{search_text}'")
+                
+                for result in results:
+                    st.markdown("---")
+                    st.markdown(f"**{result['filename']}** ({result['document_type']})")
+                    st.markdown(f"**Batch:** {result['batch_reference']} | **Product:** {result['product'] or '-'} | **Uploaded:** {result['upload_date']}")
+                    st.markdown(f"<p>{result['snippet']}</p>", unsafe_allow_html=True)
             else:
-                st.warning(f"No reports found matching batch reference '{search_batch}'")
+                st.warning(f"No documents found matching '{search_text}'")
 
 def display_report(report_data):
     """Display a full report with all details"""
@@ -1120,13 +930,107 @@ def display_report(report_data):
     # Add download button
     pdf_bytes = create_pdf_report(report_data)
     if pdf_bytes:
-        st.markdown(
-            get_download_link(
-                pdf_bytes, 
-                f"CoA_Report_{report_data['batch_info']['batch_reference']}.pdf"
-            ), 
-            unsafe_allow_html=True
-        )
+        st.download_button("Download PDF Report", pdf_bytes,
+                           file_name=f"CoA_Report_{report_data['batch_info']['batch_reference']}.pdf",
+                           mime="application/pdf")
+def build_pass_rate_trends(rollups, period, top_n):
+    """
+    Resample daily rollups to the chosen period and compute pass rates for the top_n values by volume.
+    Returns (trend, summary) DataFrames.
+    """
+    totals = rollups.groupby("value")[["total", "passed"]].sum()
+    top_values = totals["total"].nlargest(top_n).index
+    
+    summary = totals.loc[top_values].copy()
+    summary["pass_rate"] = np.where(summary["total"] > 0, summary["passed"] / summary["total"] * 100, 0.0)
+    summary = summary.sort_values("pass_rate")
+    
+    trend = rollups[rollups["value"].isin(top_values)].copy()
+    trend["period"] = pd.to_datetime(trend["day"]).dt.to_period(period).dt.start_time
+    trend = trend.groupby(["value", "period"], as_index=False)[["total", "passed"]].sum()
+    trend["pass_rate"] = np.where(trend["total"] > 0, trend["passed"] / trend["total"] * 100, 0.0)
+    return trend, summary
+
+def render_analytics_page():
+    """Render compliance trends across all comparisons from the pre-aggregated rollups"""
+    st.markdown('<h2 class="section-header">Compliance Analytics</h2>', unsafe_allow_html=True)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        dimension_label = st.radio("Pass rate by", list(ANALYTICS_DIMENSIONS), horizontal=True, key="analytics_dimension")
+    with col2:
+        period_label = st.selectbox("Period", list(ANALYTICS_PERIODS), index=1, key="analytics_period")
+    with col3:
+        date_range = st.date_input("Date range", (date.today() - timedelta(days=90), date.today()), key="analytics_dates")
+    top_n = st.slider("Values shown", min_value=1, max_value=20, value=8, key="analytics_top_n")
+    
+    # The range end is inclusive in the UI and exclusive in the rollup query
+    if len(date_range) != 2:
+        st.info("Select a start and end date")
+        return
+    date_from = date_range[0].isoformat()
+    date_to = (date_range[1] + timedelta(days=1)).isoformat()
+    
+    rollups = load_rollups(ANALYTICS_DIMENSIONS[dimension_label], date_from, date_to)
+    if rollups.empty:
+        st.warning("No comparisons in the selected date range")
+        return
+    
+    trend, summary = build_pass_rate_trends(rollups, ANALYTICS_PERIODS[period_label], top_n)
+    
+    # Headline numbers; product and supplier count comparisons, parameter counts line items
+    unit = "parameter checks" if dimension_label == "Parameter" else "comparisons"
+    total, passed = int(rollups["total"].sum()), int(rollups["passed"].sum())
+    col1, col2, col3 = st.columns(3)
+    col1.metric(f"Total {unit}", f"{total:,}")
+    col2.metric("Passed", f"{passed:,}")
+    col3.metric("Pass rate", f"{passed / total * 100:.1f}%" if total else "-")
+    
+    trend_chart = {
+        "data": [
+            {
+                "type": "scatter",
+                "mode": "lines+markers",
+                "name": value,
+                "x": group["period"].dt.strftime("%Y-%m-%d").tolist(),
+                "y": group["pass_rate"].round(1).tolist()
+            }
+            for value, group in trend.groupby("value")
+        ],
+        "layout": {
+            "title": f"Pass Rate by {dimension_label} per {period_label}",
+            "height": 350,
+            "margin": {"t": 40, "b": 30, "l": 50, "r": 30},
+            "yaxis": {"title": "Pass Rate (%)", "range": [0, 105]},
+            "legend": {"orientation": "h", "y": -0.2}
+        }
+    }
+    st.plotly_chart(trend_chart, use_container_width=True)
+    
+    summary_chart = {
+        "data": [
+            {
+                "type": "bar",
+                "x": summary["pass_rate"].round(1).tolist(),
+                "y": summary.index.tolist(),
+                "orientation": "h",
+                "marker": {"color": np.where(summary["pass_rate"] >= 90, "#28a745", "#dc3545").tolist()}
+            }
+        ],
+        "layout": {
+            "title": f"Overall Pass Rate by {dimension_label}",
+            "height": max(250, 30 * len(summary) + 80),
+            "margin": {"t": 40, "b": 30, "l": 150, "r": 30},
+            "xaxis": {"title": "Pass Rate (%)", "range": [0, 100]}
+        }
+    }
+    st.plotly_chart(summary_chart, use_container_width=True)
+    
+    st.dataframe(
+        summary.rename(columns={"total": "Total", "passed": "Passed", "pass_rate": "Pass Rate (%)"}).round(1),
+        use_container_width=True
+    )
+
 def render_about_page():
     """Render the about page"""
     st.markdown('<h2 class="section-header">About CoA Compliance Analyzer</h2>', unsafe_allow_html=True)
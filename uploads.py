@@ -0,0 +1,28 @@
+# uploads.py
+import hashlib
+import os
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB blocks
+
+
+def save_upload_stream(stream, destination_path, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Write an uploaded file to disk in fixed-size blocks, hashing it on the fly.
+    Returns the SHA-256 hex digest and the number of bytes written.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    partial_path = destination_path + ".part"
+    try:
+        with open(partial_path, "wb") as out:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        # Only expose the file under its final name once it is complete
+        os.replace(partial_path, destination_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return digest.hexdigest(), size